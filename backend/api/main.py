@@ -1,18 +1,38 @@
-import logging.config
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from backend.api.router import router as api_router
-from backend.logging_config import LOGGING_CONFIG
+from backend.database.mongodb_connection import (
+    AsyncMongoDBConnection,
+    close_async_client,
+    ensure_indexes,
+)
+from backend.logging_config import setup_logging
 
 # 配置日志
-logging.config.dictConfig(LOGGING_CONFIG)
+setup_logging()
 
 description = """
 DAG-chat API 为您的应用提供统一的大型语言模型接口。
 """
 
-app = FastAPI(title="DAG-chat API", description=description, version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # 启动时检查一次MongoDB连通性并创建索引，不放在每次请求的connect()中
+    await AsyncMongoDBConnection().connect(verify=True)
+    await ensure_indexes()
+    yield
+    # 应用关闭时释放共享的异步MongoDB连接池
+    await close_async_client()
+
+
+app = FastAPI(
+    title="DAG-chat API", description=description, version="1.0.0", lifespan=lifespan
+)
 
 # 添加CORS中间件以允许跨域请求
 app.add_middleware(
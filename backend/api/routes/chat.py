@@ -9,16 +9,21 @@
 """
 
 import asyncio
+import heapq
+import itertools
 import json
 import logging
-from collections import defaultdict
+from collections import deque
 from datetime import datetime
 from bson.errors import InvalidId
 from bson import ObjectId
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from pymongo.errors import PyMongoError
 
-from backend.database.mongodb_connection import MongoDBConnection
+from backend.database.mongodb_connection import AsyncMongoDBConnection
 from backend.database.mysql_connection import MySQLConnection
 from backend.models.requests import ChatRequest
 from backend.models.schemas import MessageNode
@@ -32,8 +37,8 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-def build_dag_from_parents(
-    mongo_db: MongoDBConnection, parent_ids: list[str]
+async def build_dag_from_parents(
+    mongo_db: AsyncMongoDBConnection, parent_ids: list[str]
 ) -> tuple[dict, dict]:
     """
     从parent_ids开始向上追溯，构建SubDAG（子图）
@@ -67,21 +72,27 @@ def build_dag_from_parents(
         return {}, {}
 
     # BFS遍历收集所有相关节点（向上追溯父节点）
-    queue = list(start_ids)
-    visited = set()
+    queue = deque(start_ids)
+    visited = set()  # 已处理的节点
+    # 已入队的节点，保证每个ID只查询一次（合并点会被多个子节点引用）
+    enqueued = {str(oid) for oid in start_ids}
     node_map = {}
-    max_depth = 2000  # 防止无限循环
-    current_depth = 0
 
-    while queue and current_depth < max_depth:
-        batch_size = min(len(queue), 100)
-        current_batch = queue[:batch_size]
-        queue = queue[batch_size:]
-
-        # 批量查询
-        nodes = mongo_db.find("message_node", {"_id": {"$in": current_batch}})
+    # 每个ID只入队一次，即使数据中存在环也必然终止
+    while queue:
+        # 取出当前一整层，按每批100个ID拆分后并发查询，
+        # 互不依赖的祖先分支不必逐批等待数据库往返
+        frontier = list(queue)
+        queue.clear()
+        batches = [frontier[i : i + 100] for i in range(0, len(frontier), 100)]
+        results = await asyncio.gather(
+            *(
+                mongo_db.find("message_node", {"_id": {"$in": batch}})
+                for batch in batches
+            )
+        )
 
-        for node in nodes:
+        for node in itertools.chain.from_iterable(results):
             node_id = str(node["_id"])
             if node_id not in visited:
                 visited.add(node_id)
@@ -89,7 +100,8 @@ def build_dag_from_parents(
 
                 # 向上追溯父节点
                 for parent_id in node.get("parent_ids", []):
-                    if parent_id and parent_id not in visited:
+                    if parent_id and parent_id not in enqueued:
+                        enqueued.add(parent_id)
                         try:
                             queue.append(ObjectId(parent_id))
                         except InvalidId:
@@ -97,17 +109,12 @@ def build_dag_from_parents(
                         except Exception:
                             continue
 
-        current_depth += 1
-
-    if current_depth >= max_depth and queue:
-        logger.warning("DAG traversal stopped due to max_depth limit (%d)", max_depth)
-
     # 构建边关系（从父节点指向子节点，只包含SubDAG内的边）
-    edges = defaultdict(list)
+    edges: dict[str, list[str]] = {}
     for node_id, node in node_map.items():
         for parent_id in node.get("parent_ids", []):
             if parent_id in node_map:
-                edges[parent_id].append(node_id)
+                edges.setdefault(parent_id, []).append(node_id)
 
     logger.info(
         "SubDAG构建完成: %d 个节点, %d 条边",
@@ -131,7 +138,7 @@ def build_dag_from_parents(
             merge_preview_str,
         )
 
-    return node_map, dict(edges)
+    return node_map, edges
 
 
 def topological_sort_subdag(node_map: dict, edges: dict) -> list[str]:
@@ -156,31 +163,43 @@ def topological_sort_subdag(node_map: dict, edges: dict) -> list[str]:
         return []
 
     # node_map 本身已经是 SubDAG，直接使用
-    subdag_nodes = set(node_map.keys())
-    logger.info("SubDAG包含 %d 个节点: %s", len(subdag_nodes), sorted(subdag_nodes))
+    logger.info("SubDAG包含 %d 个节点: %s", len(node_map), sorted(node_map))
 
     # 计算 SubDAG 内每个节点的入度和出度
-    in_degree = defaultdict(int)
-    out_degree = defaultdict(int)
-
-    for node_id in subdag_nodes:
-        # 入度：来自 SubDAG 内的父节点
-        for parent_id in node_map.get(node_id, {}).get("parent_ids", []):
-            if parent_id in subdag_nodes:
-                in_degree[node_id] += 1
-        # 出度：指向 SubDAG 内的子节点
-        for child_id in edges.get(node_id, []):
-            if child_id in subdag_nodes:
-                out_degree[node_id] += 1
+    # build_dag_from_parents 构建的边两端都在 SubDAG 内，直接由边统计，无需再做成员判断
+    in_degree = dict.fromkeys(node_map, 0)
+    for children in edges.values():
+        for child_id in children:
+            in_degree[child_id] += 1
+    out_degree = {node_id: len(edges.get(node_id, ())) for node_id in node_map}
 
     # 调试日志
     logger.debug("节点入度: %s", dict(in_degree))
     logger.debug("节点出度: %s", dict(out_degree))
 
     # 拓扑排序，保持链不切割
+    # available记录当前可选节点；两个最小堆按ID排序，分别存放全部可选节点
+    # 和可开始新链的节点（原始入度为1且出度为1），已选中的节点出堆时惰性丢弃
     result = []
-    available = {n for n in subdag_nodes if in_degree[n] == 0}
-    in_degree_copy = defaultdict(int, in_degree)
+    # 原始入度为1的节点（只有一个父节点），供链相关策略判断；
+    # in_degree在排序过程中原地递减，不再另存一份副本
+    single_parent = {n for n, d in in_degree.items() if d == 1}
+    # 每个节点原始入度为1的子节点，延续链时只需在其中查找
+    single_parent_children = {
+        node_id: [c for c in children if c in single_parent]
+        for node_id, children in edges.items()
+    }
+    available = {n for n, d in in_degree.items() if d == 0}
+    available_heap = sorted(available)
+    chain_heap = []  # 初始可选节点入度均为0，不会是新链的起点
+
+    def pop_available(heap: list[str]) -> str | None:
+        """弹出堆中ID最小的可选节点"""
+        while heap:
+            node_id = heapq.heappop(heap)
+            if node_id in available:
+                return node_id
+        return None
 
     while available:
         selected = None
@@ -190,40 +209,37 @@ def topological_sort_subdag(node_map: dict, edges: dict) -> list[str]:
             # 策略1：优先选择last_node的子节点（延续链）
             # 子节点此时入度应该为0（因为已经加入available）
             # 同时子节点的原始入度必须为1（确保是单一路径）
-            for child_id in edges.get(last_node, []):
-                if child_id in available and in_degree[child_id] == 1:
+            for child_id in single_parent_children.get(last_node, ()):
+                if child_id in available:
                     selected = child_id
                     break
 
             # 策略2：如果没有可延续的链，选择能开始新链的节点（原始入度为1且出度为1）
             if selected is None:
-                for node_id in sorted(available):
-                    if in_degree[node_id] == 1 and out_degree.get(node_id, 0) == 1:
-                        selected = node_id
-                        break
-
-                # 策略3：选择任意可用节点（按ID排序保证确定性）
-                if selected is None:
-                    selected = sorted(available)[0]
-        else:
-            # 第一个节点：选择入度为0的节点（根节点）
-            selected = sorted(available)[0]
+                selected = pop_available(chain_heap)
+
+        # 策略3：选择任意可用节点（按ID排序保证确定性）
+        # 第一个节点同样如此：选择入度为0的节点（根节点）
+        if selected is None:
+            selected = pop_available(available_heap)
 
         result.append(selected)
         available.remove(selected)
 
         # 更新子节点的入度
         for child_id in edges.get(selected, []):
-            if child_id in subdag_nodes:
-                in_degree_copy[child_id] -= 1
-                if in_degree_copy[child_id] == 0:
-                    available.add(child_id)
+            in_degree[child_id] -= 1
+            if in_degree[child_id] == 0:
+                available.add(child_id)
+                heapq.heappush(available_heap, child_id)
+                if child_id in single_parent and out_degree.get(child_id, 0) == 1:
+                    heapq.heappush(chain_heap, child_id)
 
     return result
 
 
-def build_history_from_parent_ids(
-    mongo_db: MongoDBConnection, parent_ids: list[str]
+async def build_history_from_parent_ids(
+    mongo_db: AsyncMongoDBConnection, parent_ids: list[str]
 ) -> list[dict]:
     """
     根据parent_ids构建历史消息
@@ -246,7 +262,7 @@ def build_history_from_parent_ids(
     logger.info("开始构建SubDAG历史，parent_ids: %s", parent_ids)
 
     # 步骤1：构建SubDAG
-    node_map, edges = build_dag_from_parents(mongo_db, parent_ids)
+    node_map, edges = await build_dag_from_parents(mongo_db, parent_ids)
 
     if not node_map:
         logger.warning("未找到有效的消息节点: %s", parent_ids)
@@ -266,8 +282,39 @@ def build_history_from_parent_ids(
     return ordered_messages
 
 
-@router.post("/chat")
-async def chat(request: ChatRequest):
+async def parse_chat_request(raw_request: Request) -> ChatRequest:
+    """
+    直接从原始请求体解析并校验ChatRequest
+
+    使用pydantic-core的JSON解析器一次完成解码和校验，
+    省去先解析为dict再逐字段校验的中间步骤
+
+    Raises:
+        RequestValidationError: 请求体不合法，由FastAPI返回422
+    """
+    try:
+        return ChatRequest.model_validate_json(await raw_request.body())
+    except ValidationError as e:
+        raise RequestValidationError(
+            [
+                {**error, "loc": ("body", *error["loc"])}
+                for error in e.errors(include_url=False)
+            ]
+        ) from e
+
+
+@router.post(
+    "/chat",
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "application/json": {"schema": ChatRequest.model_json_schema()}
+            },
+            "required": True,
+        }
+    },
+)
+async def chat(raw_request: Request):
     """
     对话接口
 
@@ -281,6 +328,7 @@ async def chat(request: ChatRequest):
         deep_thinking: 是否开启深度思考
         search_enabled: 是否开启搜索
     """
+    request = await parse_chat_request(raw_request)
     logger.info(
         "Chat endpoint accessed with user_id: %s, conversation_id: %s, parent_ids: %s, model: %s",
         request.user_id,
@@ -290,23 +338,29 @@ async def chat(request: ChatRequest):
     )
 
     mysql_db = MySQLConnection()
-    mongo_db = MongoDBConnection()
+    mongo_db = AsyncMongoDBConnection()
     try:
         # 构建消息历史
         chat_messages = []
         first_ask = True
 
         # 连接MongoDB
-        if mongo_db.connect():
+        if await mongo_db.connect():
             if request.parent_ids:
                 # 使用SubDAG拓扑排序构建历史（支持分支提问和合并提问）
                 logger.info(
                     "Building history from parent_ids using SubDAG topology sort: %s",
                     request.parent_ids,
                 )
-                history_messages = build_history_from_parent_ids(
-                    mongo_db, request.parent_ids
-                )
+                # connect()不再ping，MongoDB不可用时在首次查询抛出PyMongoError，
+                # 此时与连接失败一样不带历史继续对话
+                try:
+                    history_messages = await build_history_from_parent_ids(
+                        mongo_db, request.parent_ids
+                    )
+                except PyMongoError as e:
+                    logger.error("Failed to build history from MongoDB: %s", str(e))
+                    history_messages = []
                 if history_messages:
                     first_ask = False
                     chat_messages = history_messages
@@ -354,8 +408,9 @@ async def generate(chat_messages, request, mysql_db, mongo_db, first_ask):
         流式响应数据生成器
     """
     try:
-        full_content = ""
-        full_reasoning = ""
+        # 使用列表收集流式片段，结束后一次性join，避免字符串逐块拼接
+        content_parts = []
+        reasoning_parts = []
 
         # 通过模型工厂获取对应的模型服务
         model_service = ModelFactory.get_service(request.model)
@@ -384,22 +439,31 @@ async def generate(chat_messages, request, mysql_db, mongo_db, first_ask):
 
         # 流式处理每个数据块
         async for chunk in model_service.generate(chat_messages, request.deep_thinking):
-            if chunk.get("error"):
-                yield f"data: {json.dumps(chunk)}\n\n"
+            if chunk.error:
+                error_data = {"error": chunk.error, "details": chunk.details}
+                yield f"data: {json.dumps(error_data)}\n\n"
                 return
 
-            content = chunk.get("content", "")
-            reasoning = chunk.get("reasoning", "")
-            full_content += content
-            full_reasoning += reasoning
+            content = chunk.content
+            reasoning = chunk.reasoning
+            content_parts.append(content)
+            reasoning_parts.append(reasoning)
 
             # 实时返回内容
             yield f"data: {json.dumps({'content': content, 'reasoning': reasoning}, ensure_ascii=False)}\n\n"
 
+        full_content = "".join(content_parts)
+        full_reasoning = "".join(reasoning_parts)
+
         # 最终保存完整响应并获取用户消息和助手消息的MongoDB ID
-        user_message_id, ai_message_id = await save_conversation_to_database(
-            request, full_content, full_reasoning, mysql_db, mongo_db, first_ask
-        )
+        try:
+            user_message_id, ai_message_id = await save_conversation_to_database(
+                request, full_content, full_reasoning, mysql_db, mongo_db, first_ask
+            )
+        except PyMongoError as e:
+            logger.error("Failed to save conversation to MongoDB: %s", str(e))
+            yield f"data: {json.dumps({'error': '对话保存失败'}, ensure_ascii=False)}\n\n"
+            return
 
         # 返回用户消息和助手消息的MongoDB ID给前端
         if user_message_id and ai_message_id:
@@ -491,36 +555,28 @@ def update_conversation_models(
         return False
 
 
-async def save_conversation_to_database(
-    request: ChatRequest,
-    full_content: str,
-    full_reasoning: str,
-    mysql_db,
-    mongo_db,
-    first_ask: bool,
+def save_conversation_to_mysql(
+    request: ChatRequest, full_content: str, mysql_db, first_ask: bool
 ):
     """
-    保存对话内容到MySQL和MongoDB数据库
+    更新MySQL中的对话记录：新对话生成标题，老对话更新时间，并记录使用的模型
+
+    同步执行，由save_conversation_to_database在线程池中调用
 
     参数:
         request: ChatRequest对象, 包含对话ID、用户ID等信息
         full_content: 完整的AI响应内容
-        full_reasoning: 完整的AI推理内容
         mysql_db: MySQL数据库连接对象
-        mongo_db: MongoDB数据库连接对象
         first_ask: 是否是第一次问
-
-    返回:
-        tuple: (用户消息的MongoDB ID, 助手消息的MongoDB ID)
     """
     if mysql_db.connect():
         try:
             # 新对话
             if first_ask:
-                # 获取当前请求的模型服务，并调用其generate_title方法
+                # 获取当前请求的模型服务，并生成标题（命中缓存时不调用模型）
                 model_service = ModelFactory.get_service(request.model)
                 if model_service:
-                    generated_title = model_service.generate_title(
+                    generated_title = model_service.get_title(
                         request.message, full_content
                     )
                     logger.info("Generated title: %s", generated_title)
@@ -565,7 +621,35 @@ async def save_conversation_to_database(
         except Exception as e:
             logger.error("MySQL operation failed: %s", str(e), exc_info=True)
 
-    if mongo_db.connect():
+
+async def save_conversation_to_database(
+    request: ChatRequest,
+    full_content: str,
+    full_reasoning: str,
+    mysql_db,
+    mongo_db,
+    first_ask: bool,
+):
+    """
+    保存对话内容到MySQL和MongoDB数据库
+
+    参数:
+        request: ChatRequest对象, 包含对话ID、用户ID等信息
+        full_content: 完整的AI响应内容
+        full_reasoning: 完整的AI推理内容
+        mysql_db: MySQL数据库连接对象
+        mongo_db: MongoDB数据库连接对象
+        first_ask: 是否是第一次问
+
+    返回:
+        tuple: (用户消息的MongoDB ID, 助手消息的MongoDB ID)
+    """
+    # MySQL驱动和标题生成都是同步阻塞调用，放到线程池中执行，避免阻塞事件循环
+    await asyncio.to_thread(
+        save_conversation_to_mysql, request, full_content, mysql_db, first_ask
+    )
+
+    if await mongo_db.connect():
         # 保存用户提问
         user_message_kwargs = {
             "conversation_id": request.conversation_id,
@@ -577,7 +661,7 @@ async def save_conversation_to_database(
             user_message_kwargs["parent_ids"] = request.parent_ids
 
         user_message = MessageNode(**user_message_kwargs)
-        user_message_id = mongo_db.insert(
+        user_message_id = await mongo_db.insert(
             "message_node", user_message.model_dump(exclude_none=True)
         )
 
@@ -587,7 +671,7 @@ async def save_conversation_to_database(
             parent_ids_object_ids = [
                 ObjectId(parent_id) for parent_id in request.parent_ids
             ]
-            parent_message_nodes = mongo_db.find(
+            parent_message_nodes = await mongo_db.find(
                 "message_node", {"_id": {"$in": parent_ids_object_ids}}
             )
             for parent_message_node in parent_message_nodes:
@@ -595,7 +679,7 @@ async def save_conversation_to_database(
                 child_id_str = str(user_message_id)
                 if child_id_str not in parent_message_node.get("children", []):
                     parent_message_node["children"].append(child_id_str)
-                    mongo_db.update(
+                    await mongo_db.update(
                         "message_node",
                         {"_id": parent_message_node["_id"]},
                         parent_message_node,
@@ -611,7 +695,7 @@ async def save_conversation_to_database(
         if full_reasoning:
             ai_message_kwargs["reasoning"] = full_reasoning
         ai_message = MessageNode(**ai_message_kwargs)
-        ai_message_id = mongo_db.insert(
+        ai_message_id = await mongo_db.insert(
             "message_node", ai_message.model_dump(exclude_none=True)
         )
 
@@ -621,17 +705,19 @@ async def save_conversation_to_database(
         user_message_dict = user_message.model_dump(exclude_none=True)
         ai_message_id_str = str(ai_message_id)
         if ai_message_id_str not in user_message_dict.get("children", []):
-            user_message_dict["children"].append(ai_message_id_str)
+            user_message_dict["children"] += (ai_message_id_str,)
 
         # 大模型回答的parent_ids添加用户提问的ObjectId
         ai_message_dict = ai_message.model_dump(exclude_none=True)
         user_message_id_str = str(user_message_id)
         if user_message_id_str not in ai_message_dict.get("parent_ids", []):
-            ai_message_dict["parent_ids"].append(user_message_id_str)
+            ai_message_dict["parent_ids"] += (user_message_id_str,)
 
         # 更新数据库中的文档
-        mongo_db.update("message_node", {"_id": user_message_id}, user_message_dict)
-        mongo_db.update("message_node", {"_id": ai_message_id}, ai_message_dict)
+        await mongo_db.update(
+            "message_node", {"_id": user_message_id}, user_message_dict
+        )
+        await mongo_db.update("message_node", {"_id": ai_message_id}, ai_message_dict)
 
         # 返回用户消息和助手消息的MongoDB ID
         return user_message_id, ai_message_id
@@ -4,7 +4,7 @@
 """
 
 from .model_factory import ModelFactory
-from .base_service import BaseModelService
+from .base_service import BaseModelService, StreamChunk
 
 # 导入所有模型服务类，确保装饰器能正常注册
 from .deepseek_service import DeepSeekService
@@ -16,6 +16,7 @@ from .glm_service import GLMService
 __all__ = [
     "ModelFactory",
     "BaseModelService",
+    "StreamChunk",
     "DeepSeekService",
     "QwenService",
     "KimiService",
@@ -1,20 +1,47 @@
 import abc
 import logging
-from typing import List, Dict, AsyncGenerator
+from collections import OrderedDict
+from typing import (
+    List,
+    Dict,
+    AsyncGenerator,
+    NamedTuple,
+    Optional,
+)
 
 # 获取日志记录器
 logger = logging.getLogger(__name__)
 
 
+class StreamChunk(NamedTuple):
+    """
+    流式响应的单个数据块
+
+    比每个token构建一个dict更省内存，字段访问也更快
+    """
+
+    content: str = ""
+    reasoning: str = ""
+    error: Optional[str] = None
+    details: Optional[str] = None
+
+
 class BaseModelService(metaclass=abc.ABCMeta):
     """
     模型服务基类，定义所有模型服务需要实现的接口
     """
 
+    # 标题缓存容量，以及参与缓存键计算的输入/响应前缀长度
+    TITLE_CACHE_SIZE = 10_000
+    TITLE_CACHE_KEY_LENGTH = 200
+
+    # 所有服务共享的LRU标题缓存 {(服务名, 用户输入前缀, 响应前缀): 标题}
+    _title_cache: OrderedDict = OrderedDict()
+
     @abc.abstractmethod
     async def generate(
         self, messages: List[Dict[str, str]], deep_thinking: bool = False
-    ) -> AsyncGenerator[Dict[str, str], None]:
+    ) -> AsyncGenerator[StreamChunk, None]:
         """
         生成流式响应
 
@@ -23,12 +50,12 @@ class BaseModelService(metaclass=abc.ABCMeta):
             deep_thinking: 是否使用思考模型
 
         返回:
-            包含content和reasoning字段的异步生成器
+            StreamChunk的异步生成器，出错时返回带error字段的StreamChunk
         """
         pass
 
     @abc.abstractmethod
-    def generate_title(self, user_input: str, full_response: str) -> str:
+    def generate_title(self, user_input: str, full_response: str) -> Optional[str]:
         """
         生成对话标题
 
@@ -37,10 +64,43 @@ class BaseModelService(metaclass=abc.ABCMeta):
             full_response: 完整的模型响应
 
         返回:
-            生成的标题字符串
+            生成的标题字符串；调用失败或模型未返回标题时返回None
         """
         pass
 
+    def get_title(self, user_input: str, full_response: str) -> str:
+        """
+        带缓存的generate_title，相同的对话开头直接返回已生成的标题
+
+        只缓存模型真正生成的标题；generate_title失败时返回响应前20个字符作为
+        临时标题，不写入缓存，下次请求会重新生成
+
+        参数:
+            user_input: 用户输入
+            full_response: 完整的模型响应
+
+        返回:
+            生成的标题字符串
+        """
+        key = (
+            self.get_service_name(),
+            user_input[: self.TITLE_CACHE_KEY_LENGTH],
+            full_response[: self.TITLE_CACHE_KEY_LENGTH],
+        )
+        cache = BaseModelService._title_cache
+        title = cache.get(key)
+        if title is not None:
+            cache.move_to_end(key)
+            return title
+
+        title = self.generate_title(user_input, full_response)
+        if title is None:
+            return full_response[:20]
+        cache[key] = title
+        if len(cache) > self.TITLE_CACHE_SIZE:
+            cache.popitem(last=False)
+        return title
+
     @classmethod
     def get_service_name(cls) -> str:
         """
@@ -1,11 +1,11 @@
 import logging
-from typing import List, Dict, AsyncGenerator
+from typing import List, Dict, AsyncGenerator, Optional
 
 from backend.config import DEEPSEEK_API_KEY, DEEPSEEK_API_BASE_URL
 from openai import OpenAI
 from openai.types.chat import ChatCompletionUserMessageParam
 
-from .base_service import BaseModelService
+from .base_service import BaseModelService, StreamChunk
 from .model_factory import ModelFactory
 
 # 获取日志记录器
@@ -31,7 +31,7 @@ class DeepSeekService(BaseModelService):
 
     async def generate(
         self, messages: List[Dict[str, str]], deep_thinking: bool = False
-    ) -> AsyncGenerator[Dict[str, str], None]:
+    ) -> AsyncGenerator[StreamChunk, None]:
         """
         调用DeepSeek API生成流式响应
 
@@ -40,7 +40,7 @@ class DeepSeekService(BaseModelService):
             deep_thinking: 是否使用思考模型
 
         返回:
-            包含content和reasoning字段的异步生成器
+            StreamChunk的异步生成器
         """
         try:
             logger.info(
@@ -55,27 +55,32 @@ class DeepSeekService(BaseModelService):
             )
 
             for chunk in response:
+                # 保活/用量等数据块的choices可能为空或None
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+
                 # 非思考模型没有reasoning_content字段，确保兼容性
                 reasoning_chunk = ""
                 content_chunk = ""
 
                 if deep_thinking:
                     # 思考模型：处理reasoning_content和content
-                    reasoning_chunk = chunk.choices[0].delta.reasoning_content or ""
-                    content_chunk = chunk.choices[0].delta.content or ""
+                    reasoning_chunk = delta.reasoning_content or ""
+                    content_chunk = delta.content or ""
                 else:
                     # 非思考模型：只处理content，reasoning保持为空
-                    content_chunk = chunk.choices[0].delta.content or ""
+                    content_chunk = delta.content or ""
 
-                yield {"content": content_chunk, "reasoning": reasoning_chunk}
+                yield StreamChunk(content_chunk, reasoning_chunk)
 
             logger.info(f"DeepSeek API调用成功，模型: {model_name}")
 
         except Exception as e:
             logger.error(f"DeepSeek API调用失败: {str(e)}")
-            yield {"error": "模型服务暂不可用", "details": str(e)}
+            yield StreamChunk(error="模型服务暂不可用", details=str(e))
 
-    def generate_title(self, user_input: str, full_response: str) -> str:
+    def generate_title(self, user_input: str, full_response: str) -> Optional[str]:
         """
         根据用户输入和完整响应生成对话标题
 
@@ -95,9 +100,16 @@ class DeepSeekService(BaseModelService):
                 max_tokens=20,
             )
 
+            # API未返回标题时由调用方使用默认标题
+            if not response.choices:
+                return None
+            content = response.choices[0].message.content
+            if not content:
+                return None
+
             # 清理响应中的多余符号和空格
-            title = response.choices[0].message.content.strip("。\n")
+            title = content.strip("。\n")
             return title[:20]
         except Exception as e:
             logger.error(f"标题生成失败: {str(e)}")
-            return full_response[:20]
+            return None
@@ -1,9 +1,9 @@
 import logging
-from typing import List, Dict, AsyncGenerator
+from typing import List, Dict, AsyncGenerator, Optional
 
 from openai import OpenAI
 
-from .base_service import BaseModelService
+from .base_service import BaseModelService, StreamChunk
 from .model_factory import ModelFactory
 
 from backend.config import GLM_API_KEY, GLM_API_BASE_URL
@@ -31,7 +31,7 @@ class GLMService(BaseModelService):
 
     async def generate(
         self, messages: List[Dict[str, str]], deep_thinking: bool = False
-    ) -> AsyncGenerator[Dict[str, str], None]:
+    ) -> AsyncGenerator[StreamChunk, None]:
         """
         调用GLM API生成流式响应
 
@@ -40,7 +40,7 @@ class GLMService(BaseModelService):
             deep_thinking: 是否使用思考模型
 
         返回:
-            包含content和reasoning字段的异步生成器
+            StreamChunk的异步生成器
         """
         try:
             logger.info(
@@ -78,25 +78,22 @@ class GLMService(BaseModelService):
                         and delta.reasoning_content
                     ):
                         reasoning_content = delta.reasoning_content
-                        yield {"content": "", "reasoning": reasoning_content}
+                        yield StreamChunk("", reasoning_content)
                         continue
 
                     # 处理常规内容
                     content = ""
                     if hasattr(delta, "content") and delta.content:
                         content = delta.content
-                        yield {
-                            "content": content,
-                            "reasoning": "",
-                        }
+                        yield StreamChunk(content, "")
 
             logger.info("GLM API调用成功")
 
         except Exception as e:
             logger.error(f"GLM API调用失败: {str(e)}")
-            yield {"error": "模型服务暂不可用", "details": str(e)}
+            yield StreamChunk(error="模型服务暂不可用", details=str(e))
 
-    def generate_title(self, user_input: str, full_response: str) -> str:
+    def generate_title(self, user_input: str, full_response: str) -> Optional[str]:
         """
         根据用户输入和完整响应生成对话标题
         """
@@ -127,8 +124,8 @@ class GLMService(BaseModelService):
                     title = message.content.strip("。\n")
                     return title[:20]
 
-            # 如果API返回异常，使用默认方式生成标题
-            return full_response[:20]
+            # API未返回标题，由调用方使用默认标题
+            return None
         except Exception as e:
             logger.error(f"标题生成失败: {str(e)}")
-            return full_response[:20]
+            return None
@@ -1,9 +1,10 @@
 import logging
-from typing import List, Dict, AsyncGenerator
+from types import MappingProxyType
+from typing import Any, AsyncGenerator, ClassVar, Dict, List, Mapping, Optional
 
 from openai import OpenAI
 
-from .base_service import BaseModelService
+from .base_service import BaseModelService, StreamChunk
 from .model_factory import ModelFactory
 
 from backend.config import KIMI_API_KEY, KIMI_API_BASE_URL
@@ -18,6 +19,20 @@ class KimiService(BaseModelService):
     Kimi模型服务实现 - 使用 OpenAI SDK
     """
 
+    # 预构建的请求参数模板（按deep_thinking区分），调用时只需补充messages
+    # 模板为只读映射，避免通过实例修改共享的类属性
+    _STREAM_PARAMS: ClassVar[Mapping[bool, Mapping[str, Any]]] = MappingProxyType(
+        {
+            True: MappingProxyType({"model": "kimi-k2-thinking-turbo", "stream": True}),
+            False: MappingProxyType({"model": "kimi-k2-turbo-preview", "stream": True}),
+        }
+    )
+
+    # 标题生成专用的请求参数模板
+    _TITLE_PARAMS: ClassVar[Mapping[str, Any]] = MappingProxyType(
+        {"model": "moonshot-v1-8k", "temperature": 0.3, "max_tokens": 20}
+    )
+
     def __init__(self):
         # 初始化OpenAI客户端，使用Moonshot的base_url
         self.client = OpenAI(api_key=KIMI_API_KEY, base_url=KIMI_API_BASE_URL)
@@ -31,7 +46,7 @@ class KimiService(BaseModelService):
 
     async def generate(
         self, messages: List[Dict[str, str]], deep_thinking: bool = False
-    ) -> AsyncGenerator[Dict[str, str], None]:
+    ) -> AsyncGenerator[StreamChunk, None]:
         """
         调用Kimi API生成流式响应
 
@@ -40,56 +55,53 @@ class KimiService(BaseModelService):
             deep_thinking: 是否使用思考模型
 
         返回:
-            包含content和reasoning字段的异步生成器
+            StreamChunk的异步生成器
         """
         try:
             logger.info(f"Sending request to Kimi API, deep_thinking: {deep_thinking}")
 
-            # 根据deep_thinking参数选择不同的模型
-            if deep_thinking:
-                model_name = "kimi-k2-thinking-turbo"
-                logger.info("使用思考模型: kimi-k2-thinking-turbo")
-            else:
-                model_name = "kimi-k2-turbo-preview"
-                logger.info("使用非思考模型: kimi-k2-turbo-preview")
+            # 根据deep_thinking参数选择预构建的请求模板
+            request_params = self._STREAM_PARAMS[deep_thinking]
+            logger.info("使用模型: %s", request_params["model"])
 
             # 使用OpenAI SDK调用
             response = self.client.chat.completions.create(
-                model=model_name, messages=messages, stream=True
+                **request_params, messages=messages
             )
 
             # 处理流式响应
-            for chunk in response:
-                if chunk.choices and len(chunk.choices) > 0:
+            # 在循环外根据deep_thinking选择处理逻辑，避免每个chunk重复判断
+            if deep_thinking:
+                for chunk in response:
+                    # 保活/用量等数据块的choices可能为空或None
+                    if not chunk.choices:
+                        continue
                     delta = chunk.choices[0].delta
 
                     # 处理思考内容（仅在思考模式下返回）
-                    reasoning_content = ""
-                    if (
-                        deep_thinking
-                        and hasattr(delta, "reasoning_content")
-                        and delta.reasoning_content
-                    ):
-                        reasoning_content = delta.reasoning_content
-                        yield {"content": "", "reasoning": reasoning_content}
+                    reasoning_content = getattr(delta, "reasoning_content", None)
+                    if reasoning_content:
+                        yield StreamChunk("", reasoning_content)
+                    elif delta.content:
+                        yield StreamChunk(delta.content, "")
+            else:
+                for chunk in response:
+                    # 保活/用量等数据块的choices可能为空或None
+                    if not chunk.choices:
                         continue
+                    content = chunk.choices[0].delta.content
 
                     # 处理常规内容
-                    content = ""
-                    if hasattr(delta, "content") and delta.content:
-                        content = delta.content
-                        yield {
-                            "content": content,
-                            "reasoning": "",
-                        }
+                    if content:
+                        yield StreamChunk(content, "")
 
             logger.info("Kimi API调用成功")
 
         except Exception as e:
             logger.error(f"Kimi API调用失败: {str(e)}")
-            yield {"error": "模型服务暂不可用", "details": str(e)}
+            yield StreamChunk(error="模型服务暂不可用", details=str(e))
 
-    def generate_title(self, user_input: str, full_response: str) -> str:
+    def generate_title(self, user_input: str, full_response: str) -> Optional[str]:
         """
         根据用户输入和完整响应生成对话标题
         使用moonshot-v1-8k模型专门用于生成标题
@@ -103,10 +115,7 @@ class KimiService(BaseModelService):
             ]
 
             response = self.client.chat.completions.create(
-                model="moonshot-v1-8k",
-                messages=messages,
-                temperature=0.3,
-                max_tokens=20,
+                **self._TITLE_PARAMS, messages=messages
             )
 
             if (
@@ -119,8 +128,8 @@ class KimiService(BaseModelService):
                     title = message.content.strip("。\n")
                     return title[:20]
 
-            # 如果API返回异常，使用默认方式生成标题
-            return full_response[:20]
+            # API未返回标题，由调用方使用默认标题
+            return None
         except Exception as e:
             logger.error(f"标题生成失败: {str(e)}")
-            return full_response[:20]
+            return None
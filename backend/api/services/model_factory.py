@@ -28,8 +28,18 @@ class ModelFactory:
 
         返回:
             注册的服务类
+
+        异常:
+            ValueError: 服务名称已被其他服务类注册
         """
         service_name = service_class.get_service_name()
+        registered = cls._registry.get(service_name)
+        if registered is not None and registered is not service_class:
+            # 重复注册会静默覆盖之前的服务类，在导入时直接报错
+            raise ValueError(
+                f"模型服务 {service_name} 已被 {registered.__name__} 注册，"
+                f"无法重复注册 {service_class.__name__}"
+            )
         cls._registry[service_name] = service_class
         logger.info(f"注册模型服务: {service_name}")
         return service_class
@@ -1,12 +1,13 @@
 import logging
-from typing import List, Dict, AsyncGenerator
+from types import MappingProxyType
+from typing import Any, AsyncGenerator, ClassVar, Dict, List, Mapping, Optional
 
 from backend.config import QWEN_API_KEY, QWEN_API_BASE_URL
 
 from openai import OpenAI
 from openai.types.chat import ChatCompletionUserMessageParam
 
-from .base_service import BaseModelService
+from .base_service import BaseModelService, StreamChunk
 from .model_factory import ModelFactory
 
 # 获取日志记录器
@@ -19,6 +20,28 @@ class QwenService(BaseModelService):
     Qwen模型服务实现
     """
 
+    # 预构建的请求参数模板（按deep_thinking区分），调用时只需补充messages
+    # 模板为只读映射，避免通过实例修改共享的类属性
+    _STREAM_PARAMS: ClassVar[Mapping[bool, Mapping[str, Any]]] = MappingProxyType(
+        {
+            # 深度思考模型，需要开启thinking参数
+            True: MappingProxyType(
+                {
+                    "model": "qwen-plus",
+                    "stream": True,
+                    "extra_body": MappingProxyType({"enable_thinking": True}),
+                }
+            ),
+            # 非深度思考模型
+            False: MappingProxyType({"model": "qwen3-max", "stream": True}),
+        }
+    )
+
+    # 标题生成专用的请求参数模板
+    _TITLE_PARAMS: ClassVar[Mapping[str, Any]] = MappingProxyType(
+        {"model": "qwen3-max", "temperature": 0.3, "max_tokens": 20}
+    )
+
     def __init__(self):
         # 初始化OpenAI客户端
         self.client = OpenAI(api_key=QWEN_API_KEY, base_url=QWEN_API_BASE_URL)
@@ -32,7 +55,7 @@ class QwenService(BaseModelService):
 
     async def generate(
         self, messages: List[Dict[str, str]], deep_thinking: bool = False
-    ) -> AsyncGenerator[Dict[str, str], None]:
+    ) -> AsyncGenerator[StreamChunk, None]:
         """
         调用Qwen API生成流式响应
 
@@ -41,51 +64,48 @@ class QwenService(BaseModelService):
             deep_thinking: 是否使用思考模型
 
         返回:
-            包含content和reasoning字段的异步生成器
+            StreamChunk的异步生成器
         """
         try:
             logger.info(f"Sending request to Qwen API, deep_thinking: {deep_thinking}")
 
-            # 根据deep_thinking参数选择模型
-            if deep_thinking:
-                model_name = "qwen-plus"  # 深度思考模型
-                logger.info("使用深度思考模型: qwen-plus")
-            else:
-                model_name = "qwen3-max"  # 非深度思考模型
-                logger.info("使用非深度思考模型: qwen3-max")
+            # 根据deep_thinking参数选择预构建的请求模板
+            request_params = self._STREAM_PARAMS[deep_thinking]
+            model_name = request_params["model"]
+            logger.info("使用模型: %s", model_name)
 
-            # 构建请求参数
-            request_params = {"model": model_name, "messages": messages, "stream": True}
+            response = self.client.chat.completions.create(
+                **request_params, messages=messages
+            )
 
-            # 对于深度思考模型，添加thinking参数
+            # 在循环外根据deep_thinking选择处理逻辑，避免每个chunk重复判断
             if deep_thinking:
-                request_params["extra_body"] = {"enable_thinking": True}
-
-            response = self.client.chat.completions.create(**request_params)
-
-            for chunk in response:
-                # 非思考模型没有reasoning_content字段，确保兼容性
-                reasoning_chunk = ""
-                content_chunk = ""
-
-                if deep_thinking:
-                    # 思考模型：处理reasoning_content和content
+                # 思考模型：处理reasoning_content和content
+                for chunk in response:
+                    # 保活/用量等数据块的choices可能为空或None
+                    if not chunk.choices:
+                        continue
                     delta = chunk.choices[0].delta
-                    reasoning_chunk = getattr(delta, "reasoning_content", "") or ""
-                    content_chunk = delta.content or ""
-                else:
-                    # 非思考模型：只处理content，reasoning保持为空
+                    yield StreamChunk(
+                        delta.content or "",
+                        getattr(delta, "reasoning_content", None) or "",
+                    )
+            else:
+                # 非思考模型：只处理content，reasoning保持为空
+                for chunk in response:
+                    # 保活/用量等数据块的choices可能为空或None
+                    if not chunk.choices:
+                        continue
                     content_chunk = chunk.choices[0].delta.content or ""
-
-                yield {"content": content_chunk, "reasoning": reasoning_chunk}
+                    yield StreamChunk(content_chunk, "")
 
             logger.info(f"Qwen API调用成功，模型: {model_name}")
 
         except Exception as e:
             logger.error(f"Qwen API调用失败: {str(e)}")
-            yield {"error": "模型服务暂不可用", "details": str(e)}
+            yield StreamChunk(error="模型服务暂不可用", details=str(e))
 
-    def generate_title(self, user_input: str, full_response: str) -> str:
+    def generate_title(self, user_input: str, full_response: str) -> Optional[str]:
         """
         根据用户输入和完整响应生成对话标题
 
@@ -99,19 +119,16 @@ class QwenService(BaseModelService):
                 )
             ]
             response = self.client.chat.completions.create(
-                model="qwen3-max",
-                messages=messages,
-                temperature=0.3,
-                max_tokens=20,
+                **self._TITLE_PARAMS, messages=messages
             )
 
             # 清理响应中的多余符号和空格
-            content = response.choices[0].message.content
+            content = response.choices[0].message.content if response.choices else None
             if content:
                 title = content.strip("。\n")
                 return title[:20]
-            else:
-                return full_response[:20]
+            # API未返回标题，由调用方使用默认标题
+            return None
         except Exception as e:
             logger.error(f"标题生成失败: {str(e)}")
-            return full_response[:20]
+            return None
@@ -1,9 +1,11 @@
 #!/usr/bin/env python3.13
 
+import atexit
 import logging
+import threading
 
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+from pymongo import ASCENDING, AsyncMongoClient, MongoClient
+from pymongo.errors import ConnectionFailure, PyMongoError
 
 from backend import logging_config
 from backend.config import MONGODB_CONFIG
@@ -11,7 +13,106 @@ import uuid
 
 # 获取日志记录器
 logger = logging.getLogger(__name__)
-logging_config.setup_logging()
+
+# 连接池参数
+MAX_POOL_SIZE = 100
+MIN_POOL_SIZE = 10
+MAX_IDLE_TIME_MS = 60000
+SERVER_SELECTION_TIMEOUT_MS = 2000
+
+# 热点查询所需的索引 {集合名: [索引键, ...]}
+# message_node 按 conversation_id 查询并按 create_time 排序（对话历史、删除对话）
+INDEXES = {
+    "message_node": [
+        [("conversation_id", ASCENDING), ("create_time", ASCENDING)],
+    ],
+}
+
+# 进程级共享的MongoClient，MongoClient自带线程安全的连接池，
+# 每次请求新建再关闭会丢弃连接池并重复TCP握手
+_client = None
+_client_lock = threading.Lock()
+
+# 进程级共享的AsyncMongoClient，供异步请求处理函数使用
+_async_client = None
+
+
+def _client_options() -> tuple[tuple, dict]:
+    """根据MONGODB_CONFIG构建MongoClient/AsyncMongoClient的构造参数"""
+    options = {
+        "maxPoolSize": MAX_POOL_SIZE,
+        "minPoolSize": MIN_POOL_SIZE,
+        "maxIdleTimeMS": MAX_IDLE_TIME_MS,
+        "serverSelectionTimeoutMS": SERVER_SELECTION_TIMEOUT_MS,
+    }
+    if MONGODB_CONFIG["uri"]:
+        return (MONGODB_CONFIG["uri"],), options
+    if MONGODB_CONFIG.get("username") and MONGODB_CONFIG.get("password"):
+        options.update(
+            host=MONGODB_CONFIG.get("host"),
+            port=MONGODB_CONFIG.get("port"),
+            username=MONGODB_CONFIG.get("username"),
+            password=MONGODB_CONFIG.get("password"),
+            authSource="admin",
+        )
+        return (), options
+    return (MONGODB_CONFIG.get("host"), MONGODB_CONFIG.get("port")), options
+
+
+def _get_client() -> MongoClient:
+    """获取进程级共享的MongoClient，首次调用时创建"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                args, options = _client_options()
+                _client = MongoClient(*args, **options)
+    return _client
+
+
+def _get_async_client() -> AsyncMongoClient:
+    """获取进程级共享的AsyncMongoClient，首次调用时创建（仅在事件循环内调用）"""
+    global _async_client
+    if _async_client is None:
+        args, options = _client_options()
+        _async_client = AsyncMongoClient(*args, **options)
+    return _async_client
+
+
+async def ensure_indexes():
+    """
+    创建INDEXES中声明的索引，在应用启动时调用一次
+
+    create_index对已存在的索引是幂等的；失败时只记录警告，不影响启动，
+    也不会在请求路径上重试
+    """
+    db = _get_async_client()[MONGODB_CONFIG["database"]]
+    try:
+        for collection_name, index_keys in INDEXES.items():
+            for keys in index_keys:
+                await db[collection_name].create_index(keys)
+        logger.info("MongoDB indexes ensured")
+    except PyMongoError as e:
+        logger.warning(f"Error ensuring MongoDB indexes: {e}")
+
+
+async def close_async_client():
+    """关闭共享的AsyncMongoClient，在应用关闭时调用"""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+        logger.info("Async MongoDB connection pool closed")
+
+
+@atexit.register
+def _close_client():
+    """进程退出时关闭共享的MongoClient"""
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+        logger.info("MongoDB connection pool closed")
 
 
 class MongoDBConnection:
@@ -32,23 +133,13 @@ class MongoDBConnection:
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.disconnect()
 
-    def connect(self):
+    def connect(self, verify: bool = False):
         try:
-            if self.uri:
-                self.client = MongoClient(self.uri)
-            elif self.username and self.password:
-                self.client = MongoClient(
-                    host=self.host,
-                    port=self.port,
-                    username=self.username,
-                    password=self.password,
-                    authSource="admin",
-                )
-            else:
-                self.client = MongoClient(self.host, self.port)
-
-            # Check if connection is successful
-            self.client.admin.command("ping")
+            self.client = _get_client()
+
+            # 共享连接池已建立连接，默认不再额外ping；verify=True时显式检查连通性
+            if verify:
+                self.client.admin.command("ping")
             logger.info("Connected to MongoDB database")
 
             # Get database
@@ -59,9 +150,11 @@ class MongoDBConnection:
             return False
 
     def disconnect(self):
+        # 共享的连接池由进程退出时统一关闭，这里只释放引用
         if self.client:
-            self.client.close()
-            logger.info("MongoDB connection closed")
+            self.client = None
+            self.db = None
+            logger.info("MongoDB connection released")
 
     def insert(self, collection_name: str, document: dict):
         if self.client:
@@ -73,31 +166,37 @@ class MongoDBConnection:
         self,
         collection_name: str,
         query: dict,
-        projection: dict = None,
-        sort: list = None,
+        projection: dict | None = None,
+        sort: list | None = None,
+        hint=None,
+        *,
+        batch_size: int = 0,
+        limit: int = 0,
+        stream: bool = False,
     ):
+        # batch_size/limit为0时使用服务端默认值；stream=True时返回游标，
+        # 调用方边迭代边按批拉取，不一次性载入全部结果
         if self.client:
             collection = self.db[collection_name]
-            cursor = collection.find(query, projection)
+            cursor = collection.find(
+                query, projection, hint=hint, batch_size=batch_size, limit=limit
+            )
             if sort:
                 cursor = cursor.sort(sort)
-            return list(cursor)
+            return cursor if stream else list(cursor)
         return []
 
     def find_one(
         self,
         collection_name: str,
         query: dict,
-        projection: dict = None,
-        sort: list = None,
+        projection: dict | None = None,
+        sort: list | None = None,
+        hint=None,
     ):
         if self.client:
             collection = self.db[collection_name]
-            cursor = collection.find(query, projection)
-            if sort:
-                cursor = cursor.sort(sort)
-            for doc in cursor:
-                return doc
+            return collection.find_one(query, projection, sort=sort, hint=hint)
         return None
 
     def insert_one(self, collection_name: str, document: dict):
@@ -106,10 +205,11 @@ class MongoDBConnection:
             return collection.insert_one(document).inserted_id
         return None
 
-    def insert_many(self, collection_name: str, documents: list):
+    def insert_many(self, collection_name: str, documents: list, ordered=False):
+        # 一次往返写入多个文档；ordered=False时单条失败不影响其余文档写入
         if self.client:
             collection = self.db[collection_name]
-            return collection.insert_many(documents).inserted_ids
+            return collection.insert_many(documents, ordered=ordered).inserted_ids
         return None
 
     def update(self, collection_name: str, query: dict, update_values: dict):
@@ -125,11 +225,122 @@ class MongoDBConnection:
         return None
 
 
+class AsyncMongoDBConnection:
+    """
+    异步MongoDB连接，基于pymongo原生的AsyncMongoClient
+
+    供async请求处理函数使用，避免同步I/O阻塞事件循环
+    """
+
+    def __init__(self):
+        self.database = MONGODB_CONFIG["database"]
+        self.client = None
+        self.db = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.disconnect()
+
+    async def connect(self, verify: bool = False):
+        try:
+            self.client = _get_async_client()
+
+            # 共享连接池已建立连接，默认不再额外ping；verify=True时显式检查连通性
+            if verify:
+                await self.client.admin.command("ping")
+            logger.info("Connected to MongoDB database (async)")
+
+            # Get database
+            self.db = self.client[self.database]
+            return True
+        except ConnectionFailure as conn_err:
+            logger.error(f"Error connecting to MongoDB database: {conn_err}")
+            return False
+
+    def disconnect(self):
+        # 共享的连接池由应用关闭时统一关闭，这里只释放引用
+        if self.client:
+            self.client = None
+            self.db = None
+            logger.info("MongoDB connection released (async)")
+
+    async def insert(self, collection_name: str, document: dict):
+        if self.client:
+            collection = self.db[collection_name]
+            return (await collection.insert_one(document)).inserted_id
+        return None
+
+    async def find(
+        self,
+        collection_name: str,
+        query: dict,
+        projection: dict | None = None,
+        sort: list | None = None,
+        hint=None,
+        *,
+        batch_size: int = 0,
+        limit: int = 0,
+        stream: bool = False,
+    ):
+        # batch_size/limit为0时使用服务端默认值；stream=True时返回游标，
+        # 调用方async for边迭代边按批拉取，不一次性载入全部结果
+        if self.client:
+            collection = self.db[collection_name]
+            cursor = collection.find(
+                query, projection, hint=hint, batch_size=batch_size, limit=limit
+            )
+            if sort:
+                cursor = cursor.sort(sort)
+            return cursor if stream else await cursor.to_list(length=None)
+        return []
+
+    async def find_one(
+        self,
+        collection_name: str,
+        query: dict,
+        projection: dict | None = None,
+        sort: list | None = None,
+        hint=None,
+    ):
+        if self.client:
+            collection = self.db[collection_name]
+            return await collection.find_one(query, projection, sort=sort, hint=hint)
+        return None
+
+    async def insert_one(self, collection_name: str, document: dict):
+        return await self.insert(collection_name, document)
+
+    async def insert_many(self, collection_name: str, documents: list, ordered=False):
+        # 一次往返写入多个文档；ordered=False时单条失败不影响其余文档写入
+        if self.client:
+            collection = self.db[collection_name]
+            result = await collection.insert_many(documents, ordered=ordered)
+            return result.inserted_ids
+        return None
+
+    async def update(self, collection_name: str, query: dict, update_values: dict):
+        if self.client:
+            collection = self.db[collection_name]
+            return await collection.update_one(query, {"$set": update_values})
+        return None
+
+    async def delete_many(self, collection_name: str, query: dict):
+        if self.client:
+            collection = self.db[collection_name]
+            return await collection.delete_many(query)
+        return None
+
+
 # Example usage
 if __name__ == "__main__":
+    logging_config.setup_logging()
+
     # 使用上下文管理器确保连接关闭
     with MongoDBConnection() as db:
-        if db.connect():
+        if db.connect(verify=True):
             # 生成唯一测试数据
             test_id = str(uuid.uuid4())
             test_user = {
@@ -1,66 +1,120 @@
 #!/usr/bin/env python3.13
 
 import logging
+import queue
+import threading
 
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector.errors import InterfaceError, OperationalError, PoolError
 from backend.config import MYSQL_CONFIG
 
 # 获取日志记录器
 logger = logging.getLogger(__name__)
 
+# 连接池参数
+POOL_SIZE = 10
+# 连接池已满时等待空闲连接的最长秒数
+POOL_TIMEOUT = 30
 
-class MySQLConnection:
-    def __init__(self):
-        self.host = MYSQL_CONFIG["host"]
-        self.user = MYSQL_CONFIG["user"]
-        self.password = MYSQL_CONFIG["password"]
-        self.database = MYSQL_CONFIG["database"]
-        self.port = MYSQL_CONFIG["port"]
-        self.connection = None
-        self.cursor = None
+# 进程级共享的空闲连接，每次调用取出一个连接、用完放回，
+# 避免每个请求重新建立TCP连接和认证握手；后进先出，优先复用最近用过的连接
+_idle_connections = queue.LifoQueue()
 
-    def connect(self):
+# 同时使用中的连接不超过POOL_SIZE，同步路由运行在远多于POOL_SIZE的线程中，
+# 超出的调用在信号量上排队等待
+_pool_slots = threading.BoundedSemaphore(POOL_SIZE)
+
+
+def _new_connection():
+    """
+    新建一个MySQL连接
+
+    使用自动提交：读操作不会在连接上留下未结束的事务（快照），
+    连接放回时无需重置会话
+    """
+    return mysql.connector.connect(
+        host=MYSQL_CONFIG["host"],
+        user=MYSQL_CONFIG["user"],
+        password=MYSQL_CONFIG["password"],
+        database=MYSQL_CONFIG["database"],
+        port=MYSQL_CONFIG["port"],
+        autocommit=True,
+    )
+
+
+def _discard(connection):
+    """关闭已失效的连接，忽略关闭时的错误"""
+    try:
+        connection.close()
+    except Error:
+        pass
+
+
+def _run(operation, retry_on_lost=False):
+    """
+    在池中的连接上执行operation(connection)并返回其结果
+
+    取出连接时不做ping检查；执行时连接失效（OperationalError/InterfaceError）
+    则丢弃该连接。只有retry_on_lost为True（只读操作）时才在新连接上重试一次：
+    写操作可能已在服务端执行，重试会导致重复写入
+    """
+    if not _pool_slots.acquire(timeout=POOL_TIMEOUT):
+        raise PoolError("Timed out waiting for a MySQL connection")
+    try:
         try:
-            self.connection = mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.database,
-                port=self.port,
-            )
-            if self.connection.is_connected():
-                logger.info("Connected to MySQL database")
-                self.cursor = self.connection.cursor()
-                return True
-        except Error as e:
-            logger.error(f"Error connecting to MySQL database: {e}")
-            return False
+            connection = _idle_connections.get_nowait()
+        except queue.Empty:
+            connection = _new_connection()
+
+        for retry in (retry_on_lost, False):
+            try:
+                result = operation(connection)
+            except (OperationalError, InterfaceError) as e:
+                _discard(connection)
+                if not retry:
+                    raise
+                logger.warning(f"MySQL connection lost, retrying once: {e}")
+                connection = _new_connection()
+            except Error:
+                _idle_connections.put(connection)
+                raise
+            else:
+                _idle_connections.put(connection)
+                return result
+    finally:
+        _pool_slots.release()
+
+
+class MySQLConnection:
+    def connect(self):
+        # 连接在执行查询时从连接池按需取出，这里不再预先建立连接
+        return True
 
     def disconnect(self):
-        if self.connection and self.connection.is_connected():
-            self.cursor.close()
-            self.connection.close()
-            logger.info("MySQL connection closed")
+        # 连接在每次调用结束时已放回连接池，这里无需释放
+        pass
 
     def execute_query(self, query, params=None):
+        def run(connection):
+            with connection.cursor() as cursor:
+                cursor.execute(query, params or ())
+
         try:
-            if not self.connection or not self.connection.is_connected():
-                self.connect()
-            self.cursor.execute(query, params or ())
-            self.connection.commit()
+            _run(run)
             return True
         except Error as e:
             logger.error(f"Error executing query: {e}")
-            self.connection.rollback()
             return False
 
     def fetch_data(self, query, params=None):
+        def run(connection):
+            with connection.cursor() as cursor:
+                cursor.execute(query, params or ())
+                return cursor.fetchall()
+
         try:
-            if not self.connection or not self.connection.is_connected():
-                self.connect()
-            self.cursor.execute(query, params or ())
-            return self.cursor.fetchall()
+            return _run(run, retry_on_lost=True)
         except Error as e:
             logger.error(f"Error fetching data: {e}")
             return None
@@ -1,3 +1,4 @@
+import atexit
 import logging
 import logging.config
 import os
@@ -25,20 +26,44 @@ LOGGING_CONFIG = {
             "formatter": "default",
             "level": "INFO",
         },
+        # 实际写文件的handler，只挂在QueueListener上，在后台线程中执行写入
         "file": {
-            "class": "logging.FileHandler",
+            "class": "logging.handlers.RotatingFileHandler",
             "filename": os.path.join(log_dir, "app.log"),
             "formatter": "default",
             "level": "DEBUG",
+            "maxBytes": 50_000_000,
+            "backupCount": 5,
+            "encoding": "utf-8",
+            "delay": True,
+        },
+        # 请求路径上只把日志记录放入队列，避免同步的磁盘写入阻塞事件循环
+        "queue": {
+            "class": "logging.handlers.QueueHandler",
+            "handlers": ["file"],
+            "respect_handler_level": True,
         },
     },
     "root": {
-        "handlers": ["console", "file"],
+        "handlers": ["console", "queue"],
         "level": "INFO",
     },
 }
 
 
+# 日志是否已配置，重复调用dictConfig会重建所有handler（每次都新开文件句柄）
+_configured = False
+
+
 def setup_logging():
-    """设置日志配置"""
+    """设置日志配置，只在首次调用时生效"""
+    global _configured
+    if _configured:
+        return
     logging.config.dictConfig(LOGGING_CONFIG)
+
+    # dictConfig只创建QueueListener，需要手动启动，并在进程退出时刷新剩余日志
+    listener = logging.getHandlerByName("queue").listener
+    listener.start()
+    atexit.register(listener.stop)
+    _configured = True
@@ -1,13 +1,10 @@
-import logging
-
-from pydantic import BaseModel
-
-# 获取日志记录器
-logger = logging.getLogger(__name__)
-logger.debug("Initializing requests models")
+from pydantic import BaseModel, ConfigDict
 
 
 class ChatRequest(BaseModel):
+    # 请求对象只读；前端只发送以下字段，多余字段直接拒绝
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     message: str
     user_id: str = "zm-bad"
     conversation_id: str  # 必填字段，没有则请求不合法
@@ -18,6 +15,9 @@ class ChatRequest(BaseModel):
 
 
 class CreateConversationRequest(BaseModel):
+    # 前端创建对话时会附带首条message，这里忽略多余字段
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     user_id: str = "zm-bad"
     model: str = "deepseek"
     deep_thinking: bool = False
@@ -1,16 +1,15 @@
-import logging
+import sys
 from datetime import datetime
-from typing import List, Optional
+from typing import Literal, Optional, Tuple
 
-from pydantic import BaseModel, Field
-
-# 获取日志记录器
-logger = logging.getLogger(__name__)
-logger.debug("Initializing schemas models")
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 
 # 对话类
 class Conversation(BaseModel):
+    # 创建后只读，需要修改时使用model_copy(update=...)；拒绝未声明的字段
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     id: str
     user_id: str
     title: Optional[str] = None
@@ -18,16 +17,32 @@ class Conversation(BaseModel):
     create_time: Optional[datetime] = Field(default_factory=datetime.now)
     update_time: Optional[datetime] = Field(default_factory=datetime.now)
 
+    @field_validator("user_id", "model")
+    @classmethod
+    def _intern_str(cls, value: str) -> str:
+        """user_id和model取值有限，驻留后大量对象共享同一个字符串"""
+        return sys.intern(value)
+
 
 # 消息节点类
 class MessageNode(BaseModel):
+    # 创建后只读，需要修改时使用model_copy(update=...)；拒绝未声明的字段
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     _id: Optional[str] = None
     conversation_id: str
-    role: str  # 'user' or 'assistant'
+    role: Literal["user", "assistant"]
     create_time: Optional[datetime] = Field(default_factory=datetime.now)
     update_time: Optional[datetime] = Field(default_factory=datetime.now)
     content: str
     reasoning: Optional[str] = None
-    parent_ids: List[str] = []
-    children: List[str] = []
+    # 使用元组，节点关系可哈希，可直接作为缓存键
+    parent_ids: Tuple[str, ...] = ()
+    children: Tuple[str, ...] = ()
     model: Optional[str] = None  # 记录消息使用的模型
+
+    @field_validator("model")
+    @classmethod
+    def _intern_model(cls, value: Optional[str]) -> Optional[str]:
+        """模型名取值有限，驻留后大量节点共享同一个字符串"""
+        return sys.intern(value) if value is not None else None
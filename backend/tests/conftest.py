@@ -0,0 +1,27 @@
+"""
+测试公共配置
+
+backend/config.py保存数据库配置和API密钥，不提交到仓库。模型服务和数据库模块
+在导入时读取其中的配置项，缺失时注入一个占位的backend.config，使这些模块在CI中
+也能导入；测试不会用占位配置连接任何外部服务。存在真实配置时直接使用真实配置。
+"""
+
+import sys
+import types
+
+try:
+    import backend.config  # noqa: F401  # pylint: disable=unused-import
+except ImportError:
+    _stub_config = types.ModuleType("backend.config")
+    for _name in ("DEEPSEEK", "QWEN", "KIMI", "GLM"):
+        setattr(_stub_config, f"{_name}_API_KEY", "test-key")
+        setattr(_stub_config, f"{_name}_API_BASE_URL", "http://localhost")
+    _stub_config.MONGODB_CONFIG = {"uri": "mongodb://localhost", "database": "test"}
+    _stub_config.MYSQL_CONFIG = {
+        "host": "localhost",
+        "user": "test",
+        "password": "test",
+        "database": "test",
+        "port": 3306,
+    }
+    sys.modules["backend.config"] = _stub_config
@@ -10,14 +10,19 @@ DAG对话结构测试模块
 # pylint: disable=protected-access
 # 测试代码需要访问 MockMongoDB 的受保护成员 _nodes
 
-from collections import defaultdict
+import heapq
+from collections import defaultdict, deque
+from collections.abc import Iterable
 from dataclasses import dataclass, field
-from typing import Optional
+from itertools import islice
+from typing import NamedTuple
 
+import pytest
 
-@dataclass
+
+@dataclass(slots=True)
 class MockMessageNode:
-    """模拟消息节点"""
+    """模拟消息节点，使用slots省去每个实例的__dict__"""
 
     id: str
     role: str  # 'user' or 'assistant'
@@ -39,6 +44,32 @@ class MockMongoDB:
         self._nodes[node.id] = node
         return node.id
 
+    def insert_nodes(self, nodes: Iterable[MockMessageNode]) -> list[str]:
+        """批量插入节点"""
+        return [self.insert_node(node) for node in nodes]
+
+    def add_edges(self, links: Iterable[tuple[str, str]]) -> None:
+        """为已插入的节点添加(父, 子)关系，已存在的关系不重复添加"""
+        for parent_id, child_id in links:
+            parent = self._nodes[parent_id]
+            child = self._nodes[child_id]
+            if child_id not in parent.children:
+                parent.children.append(child_id)
+            if parent_id not in child.parent_ids:
+                child.parent_ids.append(parent_id)
+
+    def ancestors(self, node_id: str) -> set[str]:
+        """返回节点的全部祖先节点ID"""
+        result = set()
+        stack = [node_id]
+        while stack:
+            node = self._nodes.get(stack.pop())
+            for parent_id in node.parent_ids if node else ():
+                if parent_id not in result:
+                    result.add(parent_id)
+                    stack.append(parent_id)
+        return result
+
     def find(self, collection: str, query: dict) -> list:
         """模拟查找操作"""
         if collection != "message_node":
@@ -48,27 +79,26 @@ class MockMongoDB:
         if "_id" in query:
             id_query = query["_id"]
             if "$in" in id_query:
-                ids = id_query["$in"]
+                # 去重（与$in语义一致），保留请求顺序以保证结果确定
+                ids = dict.fromkeys(map(str, id_query["$in"]))
                 return [
-                    self._node_to_dict(self._nodes.get(str(id_obj)))
-                    for id_obj in ids
-                    if str(id_obj) in self._nodes
+                    self._node_to_dict(self._nodes[node_id])
+                    for node_id in ids
+                    if node_id in self._nodes
                 ]
             node = self._nodes.get(str(id_query))
             return [self._node_to_dict(node)] if node else []
 
         return []
 
-    def _node_to_dict(self, node: Optional[MockMessageNode]) -> Optional[dict]:
+    def _node_to_dict(self, node: MockMessageNode) -> dict:
         """将节点转换为字典格式（模拟pymongo返回）"""
-        if node is None:
-            return None
         return {
             "_id": node.id,
             "role": node.role,
             "content": node.content,
-            "parent_ids": node.parent_ids,
-            "children": node.children,
+            "parent_ids": list(node.parent_ids),
+            "children": list(node.children),
             "conversation_id": node.conversation_id,
             "model": node.model,
         }
@@ -86,19 +116,22 @@ def build_dag_from_parents(
         return {}, {}
 
     # BFS遍历收集所有相关节点（向上追溯父节点）
-    queue = list(parent_ids)
+    queue = deque(parent_ids)
     visited = set()
+    enqueued = set(parent_ids)
     node_map = {}
-    max_depth = 2000
-    current_depth = 0
-
-    while queue and current_depth < max_depth:
-        batch_size = min(len(queue), 100)
-        current_batch = queue[:batch_size]
-        queue = queue[batch_size:]
 
-        # 批量查询
-        nodes = mongo_db.find("message_node", {"_id": {"$in": current_batch}})
+    while queue:
+        # 取出当前一整层，按每批100个ID拆分查询
+        frontier = list(queue)
+        queue.clear()
+        nodes = [
+            node
+            for i in range(0, len(frontier), 100)
+            for node in mongo_db.find(
+                "message_node", {"_id": {"$in": frontier[i : i + 100]}}
+            )
+        ]
 
         for node in nodes:
             node_id = str(node["_id"])
@@ -108,19 +141,19 @@ def build_dag_from_parents(
 
                 # 向上追溯父节点
                 for parent_id in node.get("parent_ids", []):
-                    if parent_id and parent_id not in visited:
+                    if parent_id and parent_id not in enqueued:
+                        enqueued.add(parent_id)
                         queue.append(parent_id)
 
-        current_depth += 1
-
-    # 构建边关系（从父节点指向子节点）
-    edges = defaultdict(list)
+    # 构建边关系（从父节点指向子节点，只包含SubDAG内的边）
+    # 与chat.py一致按node_map顺序扫描parent_ids，子节点顺序影响链延续的选择
+    edges: dict[str, list[str]] = {}
     for node_id, node in node_map.items():
         for parent_id in node.get("parent_ids", []):
             if parent_id in node_map:
-                edges[parent_id].append(node_id)
+                edges.setdefault(parent_id, []).append(node_id)
 
-    return node_map, dict(edges)
+    return node_map, edges
 
 
 def topological_sort_subdag(node_map: dict, edges: dict) -> list[str]:
@@ -132,24 +165,34 @@ def topological_sort_subdag(node_map: dict, edges: dict) -> list[str]:
     if not node_map:
         return []
 
-    subdag_nodes = set(node_map.keys())
+    # 计算入度和出度（边的两端都在SubDAG内）
+    in_degree = dict.fromkeys(node_map, 0)
+    for children in edges.values():
+        for child_id in children:
+            in_degree[child_id] += 1
+    out_degree = {node_id: len(edges.get(node_id, ())) for node_id in node_map}
 
-    # 计算入度和出度
-    in_degree = defaultdict(int)
-    out_degree = defaultdict(int)
-
-    for node_id in subdag_nodes:
-        for parent_id in node_map.get(node_id, {}).get("parent_ids", []):
-            if parent_id in subdag_nodes:
-                in_degree[node_id] += 1
-        for child_id in edges.get(node_id, []):
-            if child_id in subdag_nodes:
-                out_degree[node_id] += 1
-
-    # 拓扑排序
+    # 拓扑排序：两个最小堆分别存放全部可选节点和可开始新链的节点，
+    # 已选中的节点出堆时惰性丢弃
     result = []
-    available = {n for n in subdag_nodes if in_degree[n] == 0}
-    in_degree_copy = defaultdict(int, in_degree)
+    # 原始入度为1的节点（只有一个父节点），供链相关策略判断；
+    # in_degree在排序过程中原地递减，不再另存一份副本
+    single_parent = {n for n, d in in_degree.items() if d == 1}
+    # 每个节点原始入度为1的子节点，延续链时只需在其中查找
+    single_parent_children = {
+        node_id: [c for c in children if c in single_parent]
+        for node_id, children in edges.items()
+    }
+    available = {n for n, d in in_degree.items() if d == 0}
+    available_heap = sorted(available)
+    chain_heap = []  # 初始可选节点入度均为0，不会是新链的起点
+
+    def pop_available(heap: list[str]) -> str | None:
+        while heap:
+            node_id = heapq.heappop(heap)
+            if node_id in available:
+                return node_id
+        return None
 
     while available:
         selected = None
@@ -157,480 +200,547 @@ def topological_sort_subdag(node_map: dict, edges: dict) -> list[str]:
         if result:
             last_node = result[-1]
             # 策略1：延续链
-            for child_id in edges.get(last_node, []):
-                if child_id in available and in_degree[child_id] == 1:
+            for child_id in single_parent_children.get(last_node, ()):
+                if child_id in available:
                     selected = child_id
                     break
 
             # 策略2：开始新链
             if selected is None:
-                for node_id in sorted(available):
-                    if in_degree[node_id] == 1 and out_degree.get(node_id, 0) == 1:
-                        selected = node_id
-                        break
-
-                # 策略3：任意选择
-                if selected is None:
-                    selected = sorted(available)[0]
-        else:
-            # 第一个节点
-            selected = sorted(available)[0]
+                selected = pop_available(chain_heap)
+
+        # 策略3：任意选择（第一个节点同样如此）
+        if selected is None:
+            selected = pop_available(available_heap)
 
         result.append(selected)
         available.remove(selected)
 
         # 更新子节点的入度
         for child_id in edges.get(selected, []):
-            if child_id in subdag_nodes:
-                in_degree_copy[child_id] -= 1
-                if in_degree_copy[child_id] == 0:
-                    available.add(child_id)
+            in_degree[child_id] -= 1
+            if in_degree[child_id] == 0:
+                available.add(child_id)
+                heapq.heappush(available_heap, child_id)
+                if child_id in single_parent and out_degree.get(child_id, 0) == 1:
+                    heapq.heappush(chain_heap, child_id)
 
     return result
 
 
-# ============== 测试数据定义 ==============
+def assert_topological_order(sorted_nodes: list[str], node_map: dict) -> None:
+    """
+    校验拓扑排序结果
 
-# 用户提问内容映射
-USER_QUESTIONS = {
-    "a": "中国四大城市分别是？",
-    "b": "介绍下北京，简洁回答",
-    "c": "介绍下上海，简洁回答",
-    "d": "介绍下广州，简洁回答",
-    "e": "介绍下深圳，简洁回答",
-    "f": "介绍下北京美食，简洁回答",
-    "g": "介绍下北京旅游胜地，简洁回答",
-    "h": "介绍下上海美食，简洁回答",
-    "i": "介绍下上海旅游胜地，简洁回答",
-    "j": "介绍下广州美食，简洁回答",
-    "k": "介绍下广州旅游胜地，简洁回答",
-    "l": "介绍下深圳美食，简洁回答",
-    "m": "介绍下深圳旅游胜地，简洁回答",
-    "n": "先去上海旅游，再去广州享用美食，给个攻略，简洁回答",
-    "o": "烧腊和肠粉哪个好吃？",
-    "p": "介绍下广州塔，简洁回答",
-    "q": "这俩和蛇肉比起来怎么样？",
-    "r": "600米，这么高，有观光电梯吗？",
-    "s": "按照你的攻略，先去了上海看东方明珠，然后去了广州吃饭，重点尝了蛇肉，真不错啊，给我弄个朋友圈文案",
-    "t": "去了广州，花了一天逛广州塔，确实高，顺便还吃了蛇肉，爽啊，给我弄个朋友圈文案",
-    "u": "我一个朋友去上海吃了美食，然后看了我的朋友圈文案，也对蛇肉感兴趣了，给他推荐下上海到广州怎么去方便？",
-}
+    结果恰好包含SubDAG的全部节点，每个父节点都排在其子节点之前，
+    且问答对不被拆开：每个assistant节点紧跟在其user提问之后
+    """
+    assert sorted(sorted_nodes) == sorted(node_map), "排序结果应恰好包含SubDAG节点"
 
-# 模拟的助手回复
-ASSISTANT_ANSWERS = {
-    "a": "中国四大城市是北京、上海、广州、深圳。",
-    "b": "北京是中国的首都，政治文化中心，有故宫、长城等历史名胜。",
-    "c": "上海是中国的经济中心，国际金融中心，有东方明珠、外滩等地标。",
-    "d": "广州是华南地区的经济文化中心，美食之都，有广州塔等景点。",
-    "e": "深圳是中国改革开放的窗口，科技创新中心，毗邻香港。",
-    "f": "北京美食有烤鸭、炸酱面、豆汁、卤煮等。",
-    "g": "北京旅游胜地有故宫、长城、颐和园、天坛等。",
-    "h": "上海美食有小笼包、生煎包、蟹壳黄、排骨年糕等。",
-    "i": "上海旅游胜所有外滩、东方明珠、豫园、南京路等。",
-    "j": "广州美食有早茶、烧腊、肠粉、叉烧等。",
-    "k": "广州旅游胜所有广州塔、陈家祠、沙面、白云山等。",
-    "l": "深圳美食有潮汕牛肉火锅、海鲜、茶餐厅美食等。",
-    "m": "深圳旅游胜所有世界之窗、欢乐谷、大梅沙、华侨城等。",
-    "n": "建议先飞往上海，游览东方明珠和外滩，品尝小笼包，然后乘高铁到广州，品尝地道早茶和烧腊。",
-    "o": "烧腊和肠粉都是广州特色美食，烧腊香酥可口，肠粉滑嫩爽口，都值得一试。",
-    "p": "广州塔（小蛮腰）高600米，是广州地标建筑，有观光平台和摩天轮。",
-    "q": "蛇肉是广东特色美食，肉质细嫩，与烧腊肠粉相比更具特色，但需要到正规餐厅品尝。",
-    "r": "有的，广州塔有高速观光电梯，1分多钟可到达观景平台。",
-    "s": "【朋友圈文案】上海东方明珠打卡✅ 广州蛇肉尝鲜✅ 一路吃遍长三角和珠三角，舌尖上的旅行太满足了！🐍🍜 #美食之旅 #上海广州",
-    "t": "【朋友圈文案】广州塔600米高空打卡✅ 蛇肉尝鲜✅ 高空+美食，今天这波操作满分！🗼🐍 #广州塔 #美食探店",
-    "u": "建议乘坐高铁，上海虹桥到广州南约7-8小时，或飞机约2.5小时。",
-}
+    positions = {node_id: i for i, node_id in enumerate(sorted_nodes)}
+    for node_id, node in node_map.items():
+        for parent_id in node.get("parent_ids", []):
+            if parent_id in positions:
+                assert positions[parent_id] < positions[node_id], (
+                    f"{parent_id}必须在{node_id}之前"
+                )
+        if node["role"] == "assistant":
+            (user_id,) = node["parent_ids"]
+            assert positions[user_id] == positions[node_id] - 1, (
+                f"{node_id}应紧跟在{user_id}之后"
+            )
 
 
-class TestComplexDAG:
-    """
-    测试复杂DAG场景
+# ============== 测试数据定义 ==============
 
-    DAG结构：
-    根节点a，分支结构如下：
-    a -> b -> f
-    a -> b -> g
-    a -> c -> h
-    a -> c -> i -> n <- j <- d <- a
-    a -> c -> i -> n <- j <- s
-    a -> d -> j -> o -> q -> s
-    a -> d -> k -> p -> r -> t
-    a -> d -> k -> t
-    a -> e -> l
-    a -> e -> m
 
-    新增节点u，parent_ids为[h, s]
-    """
+class QAPair(NamedTuple):
+    """问答对内容：用户提问与模拟的助手回复"""
+
+    question: str
+    answer: str
+
+
+# 问答对内容映射：问答对ID -> (用户提问, 助手回复)
+QA_PAIRS: dict[str, QAPair] = {
+    "a": QAPair(
+        "中国四大城市分别是？",
+        "中国四大城市是北京、上海、广州、深圳。",
+    ),
+    "b": QAPair(
+        "介绍下北京，简洁回答",
+        "北京是中国的首都，政治文化中心，有故宫、长城等历史名胜。",
+    ),
+    "c": QAPair(
+        "介绍下上海，简洁回答",
+        "上海是中国的经济中心，国际金融中心，有东方明珠、外滩等地标。",
+    ),
+    "d": QAPair(
+        "介绍下广州，简洁回答",
+        "广州是华南地区的经济文化中心，美食之都，有广州塔等景点。",
+    ),
+    "e": QAPair(
+        "介绍下深圳，简洁回答",
+        "深圳是中国改革开放的窗口，科技创新中心，毗邻香港。",
+    ),
+    "f": QAPair(
+        "介绍下北京美食，简洁回答",
+        "北京美食有烤鸭、炸酱面、豆汁、卤煮等。",
+    ),
+    "g": QAPair(
+        "介绍下北京旅游胜地，简洁回答",
+        "北京旅游胜地有故宫、长城、颐和园、天坛等。",
+    ),
+    "h": QAPair(
+        "介绍下上海美食，简洁回答",
+        "上海美食有小笼包、生煎包、蟹壳黄、排骨年糕等。",
+    ),
+    "i": QAPair(
+        "介绍下上海旅游胜地，简洁回答",
+        "上海旅游胜所有外滩、东方明珠、豫园、南京路等。",
+    ),
+    "j": QAPair(
+        "介绍下广州美食，简洁回答",
+        "广州美食有早茶、烧腊、肠粉、叉烧等。",
+    ),
+    "k": QAPair(
+        "介绍下广州旅游胜地，简洁回答",
+        "广州旅游胜所有广州塔、陈家祠、沙面、白云山等。",
+    ),
+    "l": QAPair(
+        "介绍下深圳美食，简洁回答",
+        "深圳美食有潮汕牛肉火锅、海鲜、茶餐厅美食等。",
+    ),
+    "m": QAPair(
+        "介绍下深圳旅游胜地，简洁回答",
+        "深圳旅游胜所有世界之窗、欢乐谷、大梅沙、华侨城等。",
+    ),
+    "n": QAPair(
+        "先去上海旅游，再去广州享用美食，给个攻略，简洁回答",
+        "建议先飞往上海，游览东方明珠和外滩，品尝小笼包，然后乘高铁到广州，品尝地道早茶和烧腊。",
+    ),
+    "o": QAPair(
+        "烧腊和肠粉哪个好吃？",
+        "烧腊和肠粉都是广州特色美食，烧腊香酥可口，肠粉滑嫩爽口，都值得一试。",
+    ),
+    "p": QAPair(
+        "介绍下广州塔，简洁回答",
+        "广州塔（小蛮腰）高600米，是广州地标建筑，有观光平台和摩天轮。",
+    ),
+    "q": QAPair(
+        "这俩和蛇肉比起来怎么样？",
+        "蛇肉是广东特色美食，肉质细嫩，与烧腊肠粉相比更具特色，但需要到正规餐厅品尝。",
+    ),
+    "r": QAPair(
+        "600米，这么高，有观光电梯吗？",
+        "有的，广州塔有高速观光电梯，1分多钟可到达观景平台。",
+    ),
+    "s": QAPair(
+        "按照你的攻略，先去了上海看东方明珠，然后去了广州吃饭，重点尝了蛇肉，真不错啊，给我弄个朋友圈文案",
+        "【朋友圈文案】上海东方明珠打卡✅ 广州蛇肉尝鲜✅ 一路吃遍长三角和珠三角，舌尖上的旅行太满足了！🐍🍜 #美食之旅 #上海广州",
+    ),
+    "t": QAPair(
+        "去了广州，花了一天逛广州塔，确实高，顺便还吃了蛇肉，爽啊，给我弄个朋友圈文案",
+        "【朋友圈文案】广州塔600米高空打卡✅ 蛇肉尝鲜✅ 高空+美食，今天这波操作满分！🗼🐍 #广州塔 #美食探店",
+    ),
+    "u": QAPair(
+        "我一个朋友去上海吃了美食，然后看了我的朋友圈文案，也对蛇肉感兴趣了，给他推荐下上海到广州怎么去方便？",
+        "建议乘坐高铁，上海虹桥到广州南约7-8小时，或飞机约2.5小时。",
+    ),
+}
 
-    def complex_dag_db(self):
-        """构建复杂DAG的测试数据库"""
-        db = MockMongoDB()
 
-        # 定义问答对结构（每个字母代表一个问答对）
-        # 构建顺序：按字母顺序构建a-t
+@pytest.fixture
+def complex_dag_db():
+    """构建复杂DAG的测试数据库"""
+    db = MockMongoDB()
 
-        # a: 根节点，无parent_ids
-        db.insert_node(
-            MockMessageNode(
-                id="user_a", role="user", content=USER_QUESTIONS["a"], parent_ids=[]
-            )
+    # 定义问答对结构（每个字母代表一个问答对）
+    # 构建顺序：按字母顺序构建a-t
+
+    # a: 根节点，无parent_ids
+    db.insert_node(
+        MockMessageNode(
+            id="user_a", role="user", content=QA_PAIRS["a"].question, parent_ids=[]
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_a",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["a"],
-                parent_ids=["user_a"],
-                children=["user_b", "user_c", "user_d", "user_e"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_a",
+            role="assistant",
+            content=QA_PAIRS["a"].answer,
+            parent_ids=["user_a"],
+            children=["user_b", "user_c", "user_d", "user_e"],
         )
+    )
 
-        # b-f: 北京分支
-        db.insert_node(
-            MockMessageNode(
-                id="user_b",
-                role="user",
-                content=USER_QUESTIONS["b"],
-                parent_ids=["assistant_a"],
-            )
+    # b-f: 北京分支
+    db.insert_node(
+        MockMessageNode(
+            id="user_b",
+            role="user",
+            content=QA_PAIRS["b"].question,
+            parent_ids=["assistant_a"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_b",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["b"],
-                parent_ids=["user_b"],
-                children=["user_f", "user_g"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_b",
+            role="assistant",
+            content=QA_PAIRS["b"].answer,
+            parent_ids=["user_b"],
+            children=["user_f", "user_g"],
         )
+    )
 
-        db.insert_node(
-            MockMessageNode(
-                id="user_f",
-                role="user",
-                content=USER_QUESTIONS["f"],
-                parent_ids=["assistant_b"],
-            )
+    db.insert_node(
+        MockMessageNode(
+            id="user_f",
+            role="user",
+            content=QA_PAIRS["f"].question,
+            parent_ids=["assistant_b"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_f",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["f"],
-                parent_ids=["user_f"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_f",
+            role="assistant",
+            content=QA_PAIRS["f"].answer,
+            parent_ids=["user_f"],
         )
+    )
 
-        # g: 北京旅游
-        db.insert_node(
-            MockMessageNode(
-                id="user_g",
-                role="user",
-                content=USER_QUESTIONS["g"],
-                parent_ids=["assistant_b"],
-            )
+    # g: 北京旅游
+    db.insert_node(
+        MockMessageNode(
+            id="user_g",
+            role="user",
+            content=QA_PAIRS["g"].question,
+            parent_ids=["assistant_b"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_g",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["g"],
-                parent_ids=["user_g"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_g",
+            role="assistant",
+            content=QA_PAIRS["g"].answer,
+            parent_ids=["user_g"],
         )
+    )
 
-        # c-h, i: 上海分支
-        db.insert_node(
-            MockMessageNode(
-                id="user_c",
-                role="user",
-                content=USER_QUESTIONS["c"],
-                parent_ids=["assistant_a"],
-            )
+    # c-h, i: 上海分支
+    db.insert_node(
+        MockMessageNode(
+            id="user_c",
+            role="user",
+            content=QA_PAIRS["c"].question,
+            parent_ids=["assistant_a"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_c",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["c"],
-                parent_ids=["user_c"],
-                children=["user_h", "user_i"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_c",
+            role="assistant",
+            content=QA_PAIRS["c"].answer,
+            parent_ids=["user_c"],
+            children=["user_h", "user_i"],
         )
+    )
 
-        db.insert_node(
-            MockMessageNode(
-                id="user_h",
-                role="user",
-                content=USER_QUESTIONS["h"],
-                parent_ids=["assistant_c"],
-            )
+    db.insert_node(
+        MockMessageNode(
+            id="user_h",
+            role="user",
+            content=QA_PAIRS["h"].question,
+            parent_ids=["assistant_c"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_h",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["h"],
-                parent_ids=["user_h"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_h",
+            role="assistant",
+            content=QA_PAIRS["h"].answer,
+            parent_ids=["user_h"],
         )
+    )
 
-        db.insert_node(
-            MockMessageNode(
-                id="user_i",
-                role="user",
-                content=USER_QUESTIONS["i"],
-                parent_ids=["assistant_c"],
-            )
+    db.insert_node(
+        MockMessageNode(
+            id="user_i",
+            role="user",
+            content=QA_PAIRS["i"].question,
+            parent_ids=["assistant_c"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_i",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["i"],
-                parent_ids=["user_i"],
-                children=["user_n"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_i",
+            role="assistant",
+            content=QA_PAIRS["i"].answer,
+            parent_ids=["user_i"],
+            children=["user_n"],
         )
+    )
 
-        # d-j, k: 广州分支
-        db.insert_node(
-            MockMessageNode(
-                id="user_d",
-                role="user",
-                content=USER_QUESTIONS["d"],
-                parent_ids=["assistant_a"],
-            )
+    # d-j, k: 广州分支
+    db.insert_node(
+        MockMessageNode(
+            id="user_d",
+            role="user",
+            content=QA_PAIRS["d"].question,
+            parent_ids=["assistant_a"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_d",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["d"],
-                parent_ids=["user_d"],
-                children=["user_j", "user_k"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_d",
+            role="assistant",
+            content=QA_PAIRS["d"].answer,
+            parent_ids=["user_d"],
+            children=["user_j", "user_k"],
         )
+    )
 
-        db.insert_node(
-            MockMessageNode(
-                id="user_j",
-                role="user",
-                content=USER_QUESTIONS["j"],
-                parent_ids=["assistant_d"],
-            )
+    db.insert_node(
+        MockMessageNode(
+            id="user_j",
+            role="user",
+            content=QA_PAIRS["j"].question,
+            parent_ids=["assistant_d"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_j",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["j"],
-                parent_ids=["user_j"],
-                children=["user_n", "user_o", "user_s"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_j",
+            role="assistant",
+            content=QA_PAIRS["j"].answer,
+            parent_ids=["user_j"],
+            children=["user_n", "user_o", "user_s"],
         )
+    )
 
-        db.insert_node(
-            MockMessageNode(
-                id="user_k",
-                role="user",
-                content=USER_QUESTIONS["k"],
-                parent_ids=["assistant_d"],
-            )
+    db.insert_node(
+        MockMessageNode(
+            id="user_k",
+            role="user",
+            content=QA_PAIRS["k"].question,
+            parent_ids=["assistant_d"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_k",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["k"],
-                parent_ids=["user_k"],
-                children=["user_p", "user_t"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_k",
+            role="assistant",
+            content=QA_PAIRS["k"].answer,
+            parent_ids=["user_k"],
+            children=["user_p", "user_t"],
         )
+    )
 
-        # e-l, m: 深圳分支
-        db.insert_node(
-            MockMessageNode(
-                id="user_e",
-                role="user",
-                content=USER_QUESTIONS["e"],
-                parent_ids=["assistant_a"],
-            )
+    # e-l, m: 深圳分支
+    db.insert_node(
+        MockMessageNode(
+            id="user_e",
+            role="user",
+            content=QA_PAIRS["e"].question,
+            parent_ids=["assistant_a"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_e",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["e"],
-                parent_ids=["user_e"],
-                children=["user_l", "user_m"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_e",
+            role="assistant",
+            content=QA_PAIRS["e"].answer,
+            parent_ids=["user_e"],
+            children=["user_l", "user_m"],
         )
+    )
 
-        db.insert_node(
-            MockMessageNode(
-                id="user_l",
-                role="user",
-                content=USER_QUESTIONS["l"],
-                parent_ids=["assistant_e"],
-            )
+    db.insert_node(
+        MockMessageNode(
+            id="user_l",
+            role="user",
+            content=QA_PAIRS["l"].question,
+            parent_ids=["assistant_e"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_l",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["l"],
-                parent_ids=["user_l"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_l",
+            role="assistant",
+            content=QA_PAIRS["l"].answer,
+            parent_ids=["user_l"],
         )
+    )
 
-        db.insert_node(
-            MockMessageNode(
-                id="user_m",
-                role="user",
-                content=USER_QUESTIONS["m"],
-                parent_ids=["assistant_e"],
-            )
+    db.insert_node(
+        MockMessageNode(
+            id="user_m",
+            role="user",
+            content=QA_PAIRS["m"].question,
+            parent_ids=["assistant_e"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_m",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["m"],
-                parent_ids=["user_m"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_m",
+            role="assistant",
+            content=QA_PAIRS["m"].answer,
+            parent_ids=["user_m"],
         )
+    )
 
-        # n: 合并节点（来自i和j）
-        db.insert_node(
-            MockMessageNode(
-                id="user_n",
-                role="user",
-                content=USER_QUESTIONS["n"],
-                parent_ids=["assistant_i", "assistant_j"],
-            )
+    # n: 合并节点（来自i和j）
+    db.insert_node(
+        MockMessageNode(
+            id="user_n",
+            role="user",
+            content=QA_PAIRS["n"].question,
+            parent_ids=["assistant_i", "assistant_j"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_n",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["n"],
-                parent_ids=["user_n"],
-                children=["user_s"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_n",
+            role="assistant",
+            content=QA_PAIRS["n"].answer,
+            parent_ids=["user_n"],
+            children=["user_s"],
         )
+    )
 
-        # o-q-s链
-        db.insert_node(
-            MockMessageNode(
-                id="user_o",
-                role="user",
-                content=USER_QUESTIONS["o"],
-                parent_ids=["assistant_j"],
-            )
+    # o-q-s链
+    db.insert_node(
+        MockMessageNode(
+            id="user_o",
+            role="user",
+            content=QA_PAIRS["o"].question,
+            parent_ids=["assistant_j"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_o",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["o"],
-                parent_ids=["user_o"],
-                children=["user_q"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_o",
+            role="assistant",
+            content=QA_PAIRS["o"].answer,
+            parent_ids=["user_o"],
+            children=["user_q"],
         )
+    )
 
-        db.insert_node(
-            MockMessageNode(
-                id="user_q",
-                role="user",
-                content=USER_QUESTIONS["q"],
-                parent_ids=["assistant_o"],
-            )
+    db.insert_node(
+        MockMessageNode(
+            id="user_q",
+            role="user",
+            content=QA_PAIRS["q"].question,
+            parent_ids=["assistant_o"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_q",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["q"],
-                parent_ids=["user_q"],
-                children=["user_s", "user_t"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_q",
+            role="assistant",
+            content=QA_PAIRS["q"].answer,
+            parent_ids=["user_q"],
+            children=["user_s", "user_t"],
         )
+    )
 
-        # p-r链
-        db.insert_node(
-            MockMessageNode(
-                id="user_p",
-                role="user",
-                content=USER_QUESTIONS["p"],
-                parent_ids=["assistant_k"],
-            )
+    # p-r链
+    db.insert_node(
+        MockMessageNode(
+            id="user_p",
+            role="user",
+            content=QA_PAIRS["p"].question,
+            parent_ids=["assistant_k"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_p",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["p"],
-                parent_ids=["user_p"],
-                children=["user_r"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_p",
+            role="assistant",
+            content=QA_PAIRS["p"].answer,
+            parent_ids=["user_p"],
+            children=["user_r"],
         )
+    )
 
-        db.insert_node(
-            MockMessageNode(
-                id="user_r",
-                role="user",
-                content=USER_QUESTIONS["r"],
-                parent_ids=["assistant_p"],
-            )
+    db.insert_node(
+        MockMessageNode(
+            id="user_r",
+            role="user",
+            content=QA_PAIRS["r"].question,
+            parent_ids=["assistant_p"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_r",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["r"],
-                parent_ids=["user_r"],
-                children=["user_t"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_r",
+            role="assistant",
+            content=QA_PAIRS["r"].answer,
+            parent_ids=["user_r"],
+            children=["user_t"],
         )
+    )
 
-        # s: 合并节点（来自n、j、q）
-        db.insert_node(
-            MockMessageNode(
-                id="user_s",
-                role="user",
-                content=USER_QUESTIONS["s"],
-                parent_ids=["assistant_n", "assistant_j", "assistant_q"],
-            )
+    # s: 合并节点（来自n、j、q）
+    db.insert_node(
+        MockMessageNode(
+            id="user_s",
+            role="user",
+            content=QA_PAIRS["s"].question,
+            parent_ids=["assistant_n", "assistant_j", "assistant_q"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_s",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["s"],
-                parent_ids=["user_s"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_s",
+            role="assistant",
+            content=QA_PAIRS["s"].answer,
+            parent_ids=["user_s"],
         )
+    )
 
-        # t: 合并节点（来自k、q、r）
-        db.insert_node(
-            MockMessageNode(
-                id="user_t",
-                role="user",
-                content=USER_QUESTIONS["t"],
-                parent_ids=["assistant_k", "assistant_q", "assistant_r"],
-            )
+    # t: 合并节点（来自k、q、r）
+    db.insert_node(
+        MockMessageNode(
+            id="user_t",
+            role="user",
+            content=QA_PAIRS["t"].question,
+            parent_ids=["assistant_k", "assistant_q", "assistant_r"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_t",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["t"],
-                parent_ids=["user_t"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_t",
+            role="assistant",
+            content=QA_PAIRS["t"].answer,
+            parent_ids=["user_t"],
         )
+    )
+
+    return db
+
+
+class TestComplexDAG:
+    """
+    测试复杂DAG场景
+
+    DAG结构：
+    根节点a，分支结构如下：
+    a -> b -> f
+    a -> b -> g
+    a -> c -> h
+    a -> c -> i -> n <- j <- d <- a
+    a -> c -> i -> n <- j <- s
+    a -> d -> j -> o -> q -> s
+    a -> d -> k -> p -> r -> t
+    a -> d -> k -> t
+    a -> e -> l
+    a -> e -> m
 
-        return db
+    新增节点u，parent_ids为[h, s]
+    """
 
     def test_dag_structure(self, complex_dag_db):
         """测试DAG基本结构是否正确构建"""
@@ -713,12 +823,15 @@ class TestComplexDAG:
         first_a_idx = next(i for i, x in enumerate(qa_sequence) if x == "a")
         assert first_a_idx == 0, "根节点a必须在第一位"
 
+        # 每个问答对在序列中的位置，一次遍历得到
+        positions = defaultdict(list)
+        for i, qa_id in enumerate(qa_sequence):
+            positions[qa_id].append(i)
+
         # 验证父子关系：父必须在子之前
         def assert_before(parent, child, msg=""):
-            parent_indices = [i for i, x in enumerate(qa_sequence) if x == parent]
-            child_indices = [i for i, x in enumerate(qa_sequence) if x == child]
-            if parent_indices and child_indices:
-                assert max(parent_indices) < min(child_indices), (
+            if parent in positions and child in positions:
+                assert max(positions[parent]) < min(positions[child]), (
                     msg or f"{parent}必须在{child}之前"
                 )
 
@@ -735,33 +848,43 @@ class TestComplexDAG:
         assert_before("q", "s", "q必须在s之前")
         assert_before("n", "s", "n必须在s之前")
 
+        # 所有父子关系都满足，问答对保持相邻
+        assert_topological_order(sorted_nodes, node_map)
+
+        # 完整排序结果：o、q沿j延续成链，i、n在s之前补齐
+        assert [get_qa_id(nid) for nid in sorted_nodes[::2]] == [
+            "a",
+            "c",
+            "h",
+            "d",
+            "j",
+            "o",
+            "q",
+            "i",
+            "n",
+            "s",
+        ]
+
     def test_all_paths_to_merge_node(self, complex_dag_db):
         """测试到合并节点的所有路径"""
         db = complex_dag_db
 
         parent_ids = ["assistant_h", "assistant_s"]
-        node_map, _ = build_dag_from_parents(db, parent_ids)
+        node_map, edges = build_dag_from_parents(db, parent_ids)
 
-        # 验证从h到根的路径
-        def get_path_to_root(node_id, node_map):
-            path = [node_id]
-            current = node_id
-            while True:
-                node = node_map.get(current)
-                if not node:
-                    break
-                parents = node.get("parent_ids", [])
-                if not parents:
-                    break
-                # 选择第一个父节点（对于测试简单路径）
-                current = parents[0]
-                path.append(current)
-            return list(reversed(path))
+        # 按拓扑序一次性计算每个节点沿第一个父节点到根的路径
+        # （选择第一个父节点，对于测试简单路径）
+        first_parent_chain = {}
+        for node_id in topological_sort_subdag(node_map, edges):
+            parents = node_map[node_id].get("parent_ids", ())
+            prefix = first_parent_chain.get(parents[0], []) if parents else []
+            first_parent_chain[node_id] = [*prefix, node_id]
 
         # h的路径: a -> c -> h
-        h_path = get_path_to_root("user_h", node_map)
+        h_path = first_parent_chain["user_h"]
         assert "user_a" in h_path
         assert "user_c" in h_path
+        assert {"user_a", "user_c"} <= db.ancestors("user_h")
 
         # s有多条路径，验证其中一条
         s_paths = [
@@ -775,114 +898,122 @@ class TestComplexDAG:
             for node in path:
                 assert node in node_map, f"节点{node}应该在SubDAG中"
 
+        # SubDAG恰好由合并节点及其全部祖先组成
+        expected_nodes = set(parent_ids)
+        for parent_id in parent_ids:
+            expected_nodes |= db.ancestors(parent_id)
+        assert set(node_map) == expected_nodes
 
-class TestLinkedListScenario:
-    """
-    测试链表场景（线性对话，无分支无合并）
-
-    场景：用户进行连续的线性对话，没有任何分支提问和合并提问
-    预期：对话结构退化为链表，拓扑排序结果应与插入顺序一致
-    """
-
-    def linked_list_db(self):
-        """构建链表结构的测试数据库"""
-        db = MockMongoDB()
 
-        # 构建线性对话链: a -> b -> c -> d -> e
-        # user_a -> assistant_a -> user_b -> assistant_b -> ...
+@pytest.fixture
+def linked_list_db():
+    """构建链表结构的测试数据库"""
+    db = MockMongoDB()
 
-        # a
-        db.insert_node(
-            MockMessageNode(
-                id="user_a", role="user", content=USER_QUESTIONS["a"], parent_ids=[]
-            )
+    # 构建线性对话链: a -> b -> c -> d -> e
+    # user_a -> assistant_a -> user_b -> assistant_b -> ...
+
+    # a
+    db.insert_node(
+        MockMessageNode(
+            id="user_a", role="user", content=QA_PAIRS["a"].question, parent_ids=[]
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_a",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["a"],
-                parent_ids=["user_a"],
-                children=["user_b"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_a",
+            role="assistant",
+            content=QA_PAIRS["a"].answer,
+            parent_ids=["user_a"],
+            children=["user_b"],
         )
+    )
 
-        # b
-        db.insert_node(
-            MockMessageNode(
-                id="user_b",
-                role="user",
-                content=USER_QUESTIONS["b"],
-                parent_ids=["assistant_a"],
-            )
+    # b
+    db.insert_node(
+        MockMessageNode(
+            id="user_b",
+            role="user",
+            content=QA_PAIRS["b"].question,
+            parent_ids=["assistant_a"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_b",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["b"],
-                parent_ids=["user_b"],
-                children=["user_c"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_b",
+            role="assistant",
+            content=QA_PAIRS["b"].answer,
+            parent_ids=["user_b"],
+            children=["user_c"],
         )
+    )
 
-        # c
-        db.insert_node(
-            MockMessageNode(
-                id="user_c",
-                role="user",
-                content=USER_QUESTIONS["c"],
-                parent_ids=["assistant_b"],
-            )
+    # c
+    db.insert_node(
+        MockMessageNode(
+            id="user_c",
+            role="user",
+            content=QA_PAIRS["c"].question,
+            parent_ids=["assistant_b"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_c",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["c"],
-                parent_ids=["user_c"],
-                children=["user_d"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_c",
+            role="assistant",
+            content=QA_PAIRS["c"].answer,
+            parent_ids=["user_c"],
+            children=["user_d"],
         )
+    )
 
-        # d
-        db.insert_node(
-            MockMessageNode(
-                id="user_d",
-                role="user",
-                content=USER_QUESTIONS["d"],
-                parent_ids=["assistant_c"],
-            )
+    # d
+    db.insert_node(
+        MockMessageNode(
+            id="user_d",
+            role="user",
+            content=QA_PAIRS["d"].question,
+            parent_ids=["assistant_c"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_d",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["d"],
-                parent_ids=["user_d"],
-                children=["user_e"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_d",
+            role="assistant",
+            content=QA_PAIRS["d"].answer,
+            parent_ids=["user_d"],
+            children=["user_e"],
         )
+    )
 
-        # e
-        db.insert_node(
-            MockMessageNode(
-                id="user_e",
-                role="user",
-                content=USER_QUESTIONS["e"],
-                parent_ids=["assistant_d"],
-            )
+    # e
+    db.insert_node(
+        MockMessageNode(
+            id="user_e",
+            role="user",
+            content=QA_PAIRS["e"].question,
+            parent_ids=["assistant_d"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_e",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["e"],
-                parent_ids=["user_e"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_e",
+            role="assistant",
+            content=QA_PAIRS["e"].answer,
+            parent_ids=["user_e"],
         )
+    )
+
+    return db
+
+
+class TestLinkedListScenario:
+    """
+    测试链表场景（线性对话，无分支无合并）
 
-        return db
+    场景：用户进行连续的线性对话，没有任何分支提问和合并提问
+    预期：对话结构退化为链表，拓扑排序结果应与插入顺序一致
+    """
 
     def test_linked_list_structure(self, linked_list_db):
         """测试链表结构的基本属性"""
@@ -964,168 +1095,170 @@ class TestLinkedListScenario:
             assert msg["role"] == expected_role, f"第{i}条消息应该是{expected_role}"
 
 
-class TestBranchingScenario:
-    """
-    测试分支场景（有分支，无合并）
-
-    场景：用户进行了分支提问，但没有进行合并提问
-    预期：对话结构为分支型DAG，拓扑排序应正确反映DAG的层次结构
-    """
-
-    def branching_dag_db(self):
-        """构建分支型DAG结构的测试数据库"""
-        db = MockMongoDB()
+@pytest.fixture
+def branching_dag_db():
+    """构建分支型DAG结构的测试数据库"""
+    db = MockMongoDB()
 
-        # 构建树结构：
-        #       a
-        #     / | \
-        #    b  c  d
-        #   / \    / \
-        #  e   f  g   h
+    # 构建树结构：
+    #       a
+    #     / | \
+    #    b  c  d
+    #   / \    / \
+    #  e   f  g   h
 
-        # a (根)
-        db.insert_node(
-            MockMessageNode(
-                id="user_a", role="user", content=USER_QUESTIONS["a"], parent_ids=[]
-            )
+    # a (根)
+    db.insert_node(
+        MockMessageNode(
+            id="user_a", role="user", content=QA_PAIRS["a"].question, parent_ids=[]
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_a",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["a"],
-                parent_ids=["user_a"],
-                children=["user_b", "user_c", "user_d"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_a",
+            role="assistant",
+            content=QA_PAIRS["a"].answer,
+            parent_ids=["user_a"],
+            children=["user_b", "user_c", "user_d"],
         )
+    )
 
-        # b分支
-        db.insert_node(
-            MockMessageNode(
-                id="user_b",
-                role="user",
-                content=USER_QUESTIONS["b"],
-                parent_ids=["assistant_a"],
-            )
+    # b分支
+    db.insert_node(
+        MockMessageNode(
+            id="user_b",
+            role="user",
+            content=QA_PAIRS["b"].question,
+            parent_ids=["assistant_a"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_b",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["b"],
-                parent_ids=["user_b"],
-                children=["user_e", "user_f"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_b",
+            role="assistant",
+            content=QA_PAIRS["b"].answer,
+            parent_ids=["user_b"],
+            children=["user_e", "user_f"],
         )
+    )
 
-        # c分支
-        db.insert_node(
-            MockMessageNode(
-                id="user_c",
-                role="user",
-                content=USER_QUESTIONS["c"],
-                parent_ids=["assistant_a"],
-            )
+    # c分支
+    db.insert_node(
+        MockMessageNode(
+            id="user_c",
+            role="user",
+            content=QA_PAIRS["c"].question,
+            parent_ids=["assistant_a"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_c",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["c"],
-                parent_ids=["user_c"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_c",
+            role="assistant",
+            content=QA_PAIRS["c"].answer,
+            parent_ids=["user_c"],
         )
+    )
 
-        # d分支
-        db.insert_node(
-            MockMessageNode(
-                id="user_d",
-                role="user",
-                content=USER_QUESTIONS["d"],
-                parent_ids=["assistant_a"],
-            )
+    # d分支
+    db.insert_node(
+        MockMessageNode(
+            id="user_d",
+            role="user",
+            content=QA_PAIRS["d"].question,
+            parent_ids=["assistant_a"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_d",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["d"],
-                parent_ids=["user_d"],
-                children=["user_g", "user_h"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_d",
+            role="assistant",
+            content=QA_PAIRS["d"].answer,
+            parent_ids=["user_d"],
+            children=["user_g", "user_h"],
         )
+    )
 
-        # e, f (b的子节点)
-        db.insert_node(
-            MockMessageNode(
-                id="user_e",
-                role="user",
-                content=USER_QUESTIONS["e"],
-                parent_ids=["assistant_b"],
-            )
+    # e, f (b的子节点)
+    db.insert_node(
+        MockMessageNode(
+            id="user_e",
+            role="user",
+            content=QA_PAIRS["e"].question,
+            parent_ids=["assistant_b"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_e",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["e"],
-                parent_ids=["user_e"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_e",
+            role="assistant",
+            content=QA_PAIRS["e"].answer,
+            parent_ids=["user_e"],
         )
+    )
 
-        db.insert_node(
-            MockMessageNode(
-                id="user_f",
-                role="user",
-                content=USER_QUESTIONS["f"],
-                parent_ids=["assistant_b"],
-            )
+    db.insert_node(
+        MockMessageNode(
+            id="user_f",
+            role="user",
+            content=QA_PAIRS["f"].question,
+            parent_ids=["assistant_b"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_f",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["f"],
-                parent_ids=["user_f"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_f",
+            role="assistant",
+            content=QA_PAIRS["f"].answer,
+            parent_ids=["user_f"],
         )
+    )
 
-        # g, h (d的子节点)
-        db.insert_node(
-            MockMessageNode(
-                id="user_g",
-                role="user",
-                content=USER_QUESTIONS["g"],
-                parent_ids=["assistant_d"],
-            )
+    # g, h (d的子节点)
+    db.insert_node(
+        MockMessageNode(
+            id="user_g",
+            role="user",
+            content=QA_PAIRS["g"].question,
+            parent_ids=["assistant_d"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_g",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["g"],
-                parent_ids=["user_g"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_g",
+            role="assistant",
+            content=QA_PAIRS["g"].answer,
+            parent_ids=["user_g"],
         )
+    )
 
-        db.insert_node(
-            MockMessageNode(
-                id="user_h",
-                role="user",
-                content=USER_QUESTIONS["h"],
-                parent_ids=["assistant_d"],
-            )
+    db.insert_node(
+        MockMessageNode(
+            id="user_h",
+            role="user",
+            content=QA_PAIRS["h"].question,
+            parent_ids=["assistant_d"],
         )
-        db.insert_node(
-            MockMessageNode(
-                id="assistant_h",
-                role="assistant",
-                content=ASSISTANT_ANSWERS["h"],
-                parent_ids=["user_h"],
-            )
+    )
+    db.insert_node(
+        MockMessageNode(
+            id="assistant_h",
+            role="assistant",
+            content=QA_PAIRS["h"].answer,
+            parent_ids=["user_h"],
         )
+    )
+
+    return db
+
 
-        return db
+class TestBranchingScenario:
+    """
+    测试分支场景（有分支，无合并）
+
+    场景：用户进行了分支提问，但没有进行合并提问
+    预期：对话结构为分支型DAG，拓扑排序应正确反映DAG的层次结构
+    """
 
     def test_branching_structure(self, branching_dag_db):
         """测试分支型DAG结构的基本属性"""
@@ -1182,14 +1315,16 @@ class TestBranchingScenario:
         assert actual_nodes == expected_nodes
 
         # 验证拓扑顺序：a必须在b之前，b必须在f之前
-        def get_index(node_id):
-            return sorted_nodes.index(node_id)
+        get_index = {node_id: i for i, node_id in enumerate(sorted_nodes)}.__getitem__
 
         assert get_index("user_a") < get_index("assistant_a")
         assert get_index("assistant_a") < get_index("user_b")
         assert get_index("user_b") < get_index("assistant_b")
         assert get_index("assistant_b") < get_index("user_f")
 
+        # 所有父子关系都满足，问答对保持相邻
+        assert_topological_order(sorted_nodes, node_map)
+
     def test_branching_subdag_from_multiple_leaves(self, branching_dag_db):
         """测试从多个叶子节点构建SubDAG（模拟合并提问前的状态）"""
         db = branching_dag_db
@@ -1214,12 +1349,18 @@ class TestBranchingScenario:
         actual_nodes = set(node_map.keys())
         assert expected_nodes <= actual_nodes
 
+        # 不应包含两个叶子节点祖先以外的节点
+        leaf_ancestors = db.ancestors("assistant_e") | db.ancestors("assistant_h")
+        assert actual_nodes == leaf_ancestors | set(parent_ids)
+
         # 进行拓扑排序
         sorted_nodes = topological_sort_subdag(node_map, edges)
 
         # 验证顺序约束
+        positions = {node_id: i for i, node_id in enumerate(sorted_nodes)}
+
         def assert_before(parent, child):
-            assert sorted_nodes.index(parent) < sorted_nodes.index(child)
+            assert positions[parent] < positions[child]
 
         assert_before("user_a", "assistant_a")
         assert_before("assistant_a", "user_b")
@@ -1229,6 +1370,21 @@ class TestBranchingScenario:
         assert_before("user_d", "assistant_d")
         assert_before("assistant_d", "user_h")
 
+        # 所有父子关系都满足，问答对保持相邻；b分支沿链走完后再进入d分支
+        assert_topological_order(sorted_nodes, node_map)
+        assert sorted_nodes == [
+            "user_a",
+            "assistant_a",
+            "user_b",
+            "assistant_b",
+            "user_e",
+            "assistant_e",
+            "user_d",
+            "assistant_d",
+            "user_h",
+            "assistant_h",
+        ]
+
 
 class TestEdgeCases:
     """测试边界情况"""
@@ -1279,24 +1435,26 @@ def test_complex_dag_with_user_questions():
     # 实际存储中，边的关系是：assistant_父 -> user_子
 
     # 首先创建所有问答对
-    qa_pairs = list(USER_QUESTIONS.keys())[:20]  # a-t
+    qa_pairs = tuple(islice(QA_PAIRS, 20))  # a-t
 
-    # 构建节点
+    # 构建节点，全部收集后一次批量写入
+    nodes = []
     for qa_id in qa_pairs:
-        # user节点
-        user_node = MockMessageNode(
-            id=f"user_{qa_id}", role="user", content=USER_QUESTIONS[qa_id]
-        )
-        db.insert_node(user_node)
-
-        # assistant节点 - parent_ids指向对应的user节点
-        assistant_node = MockMessageNode(
-            id=f"assistant_{qa_id}",
-            role="assistant",
-            content=ASSISTANT_ANSWERS[qa_id],
-            parent_ids=[f"user_{qa_id}"],  # assistant的parent是user
-        )
-        db.insert_node(assistant_node)
+        question, answer = QA_PAIRS[qa_id]
+        nodes.extend(
+            (
+                # user节点
+                MockMessageNode(id=f"user_{qa_id}", role="user", content=question),
+                # assistant节点 - parent_ids指向对应的user节点
+                MockMessageNode(
+                    id=f"assistant_{qa_id}",
+                    role="assistant",
+                    content=answer,
+                    parent_ids=[f"user_{qa_id}"],  # assistant的parent是user
+                ),
+            )
+        )
+    db.insert_nodes(nodes)
 
     # 定义父子关系并更新节点
     # a<-b, a<-c, a<-d, a<-e 表示assistant_a -> user_b, user_c, user_d, user_e
@@ -1328,18 +1486,9 @@ def test_complex_dag_with_user_questions():
     ]
 
     # 更新节点的parent_ids和children
-    for parent, child in relationships:
-        assistant_parent = db._nodes[f"assistant_{parent}"]
-        user_child = db._nodes[f"user_{child}"]
-
-        if f"user_{child}" not in assistant_parent.children:
-            assistant_parent.children.append(f"user_{child}")
-
-        if f"assistant_{parent}" not in user_child.parent_ids:
-            user_child.parent_ids.append(f"assistant_{parent}")
-
-    # 设置根节点a的parent_ids（空列表表示没有父节点）
-    db._nodes["user_a"].parent_ids = []
+    db.add_edges(
+        (f"assistant_{parent}", f"user_{child}") for parent, child in relationships
+    )
 
     # 现在测试新增节点u，parent_ids为[assistant_h, assistant_s]
     # 先创建u节点
@@ -1347,7 +1496,7 @@ def test_complex_dag_with_user_questions():
         MockMessageNode(
             id="user_u",
             role="user",
-            content=USER_QUESTIONS["u"],
+            content=QA_PAIRS["u"].question,
             parent_ids=["assistant_h", "assistant_s"],
         )
     )
@@ -1355,14 +1504,13 @@ def test_complex_dag_with_user_questions():
         MockMessageNode(
             id="assistant_u",
             role="assistant",
-            content=ASSISTANT_ANSWERS["u"],
+            content=QA_PAIRS["u"].answer,
             parent_ids=["user_u"],
         )
     )
 
     # 更新h和s的children
-    db._nodes["assistant_h"].children.append("user_u")
-    db._nodes["assistant_s"].children.append("user_u")
+    db.add_edges([("assistant_h", "user_u"), ("assistant_s", "user_u")])
 
     # 测试：从h和s构建SubDAG
     parent_ids = ["assistant_h", "assistant_s"]
@@ -1392,9 +1540,11 @@ def test_complex_dag_with_user_questions():
         assert node in actual_qa_set, f"节点{node}应该在SubDAG中"
 
     # 验证拓扑顺序约束（使用去重后的序列）
+    qa_positions = {qa_id: i for i, qa_id in enumerate(qa_sequence_deduplicated)}
+
     def assert_before(parent, child):
-        parent_idx = qa_sequence_deduplicated.index(parent)
-        child_idx = qa_sequence_deduplicated.index(child)
+        parent_idx = qa_positions[parent]
+        child_idx = qa_positions[child]
         assert parent_idx < child_idx, (
             f"{parent}({parent_idx})必须在{child}({child_idx})之前"
         )
@@ -1416,10 +1566,13 @@ def test_complex_dag_with_user_questions():
 
     # 验证o和q的连续性（链不切割）
     # o和q在去重序列中应该是连续的，因为j->o->q形成一条链
-    o_idx = qa_sequence_deduplicated.index("o")
-    q_idx = qa_sequence_deduplicated.index("q")
+    o_idx = qa_positions["o"]
+    q_idx = qa_positions["q"]
     assert q_idx == o_idx + 1, f"o和q应该连续，但o在{o_idx}，q在{q_idx}"
 
+    # 所有父子关系都满足，问答对保持相邻
+    assert_topological_order(sorted_nodes, node_map)
+
     # 验证h和d的相对顺序（它们都是c的子节点或分支）
     # h是c的分支，d是c的兄弟分支
     # 由于c的入度为1，出度为2，h和i都是c的子节点
@@ -0,0 +1,96 @@
+"""
+标题缓存测试模块
+
+测试BaseModelService.get_title的LRU标题缓存：
+1. 命中缓存时不再调用generate_title
+2. 不同的对话开头各自生成标题
+3. 超出容量时淘汰最久未使用的标题
+4. generate_title失败时返回默认标题且不写入缓存
+"""
+
+# pylint: disable=protected-access
+# 测试代码需要访问 BaseModelService 的受保护成员 _title_cache
+
+from collections import OrderedDict
+
+import pytest
+
+# 模型服务包在导入时读取backend.config，缺失时由conftest.py注入占位配置
+from backend.api.services.base_service import BaseModelService
+
+
+class FakeTitleService(BaseModelService):
+    """按预设结果返回标题的模型服务，记录generate_title的调用次数"""
+
+    def __init__(self, titles=None):
+        self.titles = list(titles or [])
+        self.calls = 0
+
+    async def generate(self, messages, deep_thinking=False):
+        yield  # pragma: no cover
+
+    def generate_title(self, user_input, full_response):
+        self.calls += 1
+        if self.titles:
+            return self.titles.pop(0)
+        return f"标题{self.calls}"
+
+
+@pytest.fixture(autouse=True)
+def title_cache(monkeypatch):
+    """每个测试使用独立的空缓存，容量缩小为2便于验证淘汰"""
+    cache = OrderedDict()
+    monkeypatch.setattr(BaseModelService, "_title_cache", cache)
+    monkeypatch.setattr(FakeTitleService, "TITLE_CACHE_SIZE", 2)
+    return cache
+
+
+class TestTitleCache:
+    """测试标题缓存"""
+
+    def test_cache_hit(self):
+        """相同的对话开头第二次直接返回缓存的标题"""
+        service = FakeTitleService()
+
+        assert service.get_title("问题", "回答") == "标题1"
+        assert service.get_title("问题", "回答") == "标题1"
+        assert service.calls == 1
+
+    def test_cache_miss(self):
+        """用户输入或响应不同时重新生成标题"""
+        service = FakeTitleService()
+
+        assert service.get_title("问题", "回答") == "标题1"
+        assert service.get_title("问题", "另一个回答") == "标题2"
+        assert service.get_title("另一个问题", "回答") == "标题3"
+        assert service.calls == 3
+
+    def test_lru_eviction(self, title_cache):
+        """超出容量时淘汰最久未使用的标题，命中的标题移到最近使用"""
+        service = FakeTitleService()
+
+        service.get_title("a", "a")
+        service.get_title("b", "b")
+        # 命中a，b成为最久未使用
+        service.get_title("a", "a")
+        service.get_title("c", "c")
+
+        assert len(title_cache) == 2
+        assert [key[1] for key in title_cache] == ["a", "c"]
+
+        # b已被淘汰，需要重新生成
+        service.get_title("b", "b")
+        assert service.calls == 4
+
+    def test_failure_not_cached(self, title_cache):
+        """generate_title失败时返回响应前20个字符，且不写入缓存"""
+        full_response = "这是一段超过二十个字符的模型回答，用于生成默认标题"
+        service = FakeTitleService(titles=[None, "真实标题"])
+
+        assert service.get_title("问题", full_response) == full_response[:20]
+        assert not title_cache
+
+        # 下次请求重新生成，成功后才写入缓存
+        assert service.get_title("问题", full_response) == "真实标题"
+        assert service.get_title("问题", full_response) == "真实标题"
+        assert service.calls == 2
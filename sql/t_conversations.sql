@@ -11,7 +11,7 @@ CREATE TABLE IF NOT EXISTS t_conversations
     create_time TIMESTAMP   NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
     update_time TIMESTAMP   NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
     PRIMARY KEY (id),
-    KEY idx_user_id (user_id),
+    KEY idx_user_id_update_time (user_id, update_time),
     KEY idx_update_time (update_time)
 ) ENGINE = InnoDB
   DEFAULT CHARSET = utf8mb4